@@ -36,26 +36,11 @@ AWS_REGION="us-east-1"
 echo "🌍 Using AWS region: $AWS_REGION"
 echo "ℹ️  Note: Bedrock Claude 3 Sonnet is available in us-east-1, us-west-2, eu-west-1"
 
-# Build Lambda deployment package
+# Build Lambda deployment package: function code, routing policy and precompiled
+# bytecode (boto3 comes from the Lambda runtime; set BUNDLE_BOTO3=1 to pin it)
 echo "📦 Building Lambda deployment package..."
 cd lambda
-
-# Create package directory
-mkdir -p package
-
-# Install Python dependencies
-echo "📥 Installing Python dependencies..."
-pip install -r requirements.txt -t package/ --quiet
-
-# Copy Lambda function code
-echo "📋 Copying Lambda function code..."
-cp *.py package/
-
-# Create deployment zip
-echo "🗜️ Creating deployment package..."
-cd package
-zip -r ../app.zip . --quiet
-cd ..
+bash build_package.sh
 
 # Navigate to terraform examples directory
 cd ../terraform/examples/production
@@ -1,20 +1,1053 @@
 import json
 import boto3
+from boto3.resources.base import ServiceResource
 import os
+import queue
 import logging
-import jwt
-import base64
-from datetime import datetime
-from botocore.exceptions import ClientError
+import hashlib
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from contextlib import contextmanager, nullcontext
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from datetime import date, datetime, timezone
+from botocore.config import Config
+from botocore.exceptions import ClientError, ConnectTimeoutError, ReadTimeoutError, EndpointConnectionError
 
 # Configure logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-# Initialize AWS clients
-dynamodb = boto3.resource('dynamodb')
-bedrock = boto3.client('bedrock-runtime')
-secrets_client = boto3.client('secretsmanager')
+# Per-stage latency metrics, emitted as CloudWatch Embedded Metric Format log lines
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() == 'true'
+METRICS_NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'AgeResponsiveAI')
+
+STAGE_METRICS = {
+    'get_user_profile': 'UserProfileLatency',
+    'get_conversation_state': 'ConversationHistoryLatency',
+    'auto_correct_grammar': 'GrammarCorrectionLatency',
+    'generate_context_aware_prompt': 'PromptBuildLatency',
+    'call_bedrock_with_guardrails': 'BedrockLatency',
+    'record_turn': 'TurnPersistLatency'
+}
+
+# Count-unit metrics that are point-in-time readings: merged by maximum, not summed
+GAUGE_METRICS = {'BreakersOpen'}
+
+class RequestTrace:
+    """Collects stage durations for one request and emits them as a single EMF line"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.durations = {}
+        self.samples = {}
+        self.counts = {}
+
+    @contextmanager
+    def span(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.durations[stage] = self.durations.get(stage, 0.0) + (time.perf_counter() - start) * 1000
+
+    def timed(self, stage, func):
+        """Wrap func so its duration is recorded (for work submitted to executors)"""
+        def traced(*args, **kwargs):
+            with self.span(stage):
+                return func(*args, **kwargs)
+        return traced
+
+    def count(self, metric, value=1):
+        self.counts[metric] = self.counts.get(metric, 0) + value
+
+    def merge(self, other):
+        """Fold a batch item's trace in: its stage durations become samples (EMF value arrays), counts add up"""
+        for stage, ms in other.durations.items():
+            self.samples.setdefault(stage, []).append(round(ms, 3))
+        for metric, value in other.counts.items():
+            if metric in GAUGE_METRICS:
+                self.counts[metric] = max(self.counts.get(metric, 0), value)
+            else:
+                self.count(metric, value)
+
+    def emit(self, age_group, protection_level, model_id=None, latency_metric='RequestLatency', **properties):
+        durations = {STAGE_METRICS[stage]: round(ms, 3) for stage, ms in self.durations.items()}
+        # EMF takes at most 100 values per metric
+        durations.update({STAGE_METRICS[stage]: values[:100] for stage, values in self.samples.items()})
+        durations[latency_metric] = round((time.perf_counter() - self.started) * 1000, 3)
+        metrics = [{'Name': name, 'Unit': 'Milliseconds'} for name in durations]
+        metrics += [{'Name': name, 'Unit': 'Count'} for name in self.counts]
+        print(json.dumps(dict(
+            {
+                '_aws': {
+                    'Timestamp': int(time.time() * 1000),
+                    'CloudWatchMetrics': [{
+                        'Namespace': METRICS_NAMESPACE,
+                        'Dimensions': [['AgeGroup', 'ProtectionLevel'], ['ModelId']],
+                        'Metrics': metrics
+                    }]
+                },
+                'AgeGroup': age_group or 'unknown',
+                'ProtectionLevel': protection_level or 'unknown',
+                # 'none' when no model was called (pre-screened queries, degraded responses)
+                'ModelId': model_id or 'none'
+            },
+            **durations,
+            **self.counts,
+            **properties
+        )))
+
+class NullTrace:
+    """Used when metrics are disabled: spans are shared no-op context managers"""
+
+    _noop = nullcontext()
+
+    def span(self, stage):
+        return self._noop
+
+    def timed(self, stage, func):
+        return func
+
+    def count(self, metric, value=1):
+        pass
+
+    def merge(self, other):
+        pass
+
+    def emit(self, age_group, protection_level, model_id=None, latency_metric='RequestLatency', **properties):
+        pass
+
+NULL_TRACE = NullTrace()
+
+def start_trace():
+    return RequestTrace() if METRICS_ENABLED else NULL_TRACE
+
+def client_config(prefix, max_pool_connections, connect_timeout, read_timeout, max_attempts):
+    """botocore Config with explicit pool size, adaptive retries and timeouts, overridable via <PREFIX>_* env vars"""
+    return Config(
+        max_pool_connections=int(os.environ.get(f'{prefix}_MAX_POOL_CONNECTIONS', max_pool_connections)),
+        connect_timeout=float(os.environ.get(f'{prefix}_CONNECT_TIMEOUT', connect_timeout)),
+        read_timeout=float(os.environ.get(f'{prefix}_READ_TIMEOUT', read_timeout)),
+        retries={
+            'mode': 'adaptive',
+            'max_attempts': int(os.environ.get(f'{prefix}_MAX_ATTEMPTS', max_attempts))
+        }
+    )
+
+# AWS clients are created on first use, so preflights and rejected requests on a
+# cold container never pay for them. LAZY_CLIENTS=false creates them at import
+# instead, for provisioned concurrency where the init phase is already paid for.
+LAZY_CLIENTS = os.environ.get('LAZY_CLIENTS', 'true').lower() == 'true'
+dynamodb = None
+bedrock = None
+clients_lock = threading.Lock()
+dynamodb_local = threading.local()
+
+def get_dynamodb():
+    """
+    DynamoDB resource for the calling thread. boto3 resources are not
+    thread-safe, but the prefetch, batch and audit threads all use one, so
+    each thread gets its own resource around the shared (thread-safe) client
+    and its connection pool; only the client is created once, on first use.
+    """
+    global dynamodb
+    if dynamodb is None:
+        # boto3 client creation is not thread-safe; the prefetch threads may race here
+        with clients_lock:
+            if dynamodb is None:
+                dynamodb = boto3.resource('dynamodb', config=client_config('DYNAMODB', 20, 1, 3, 3))
+    if getattr(dynamodb_local, 'shared', None) is not dynamodb:
+        dynamodb_local.shared = dynamodb
+        # Stand-ins assigned to app.dynamodb (benchmarks) are used as they are
+        dynamodb_local.resource = (
+            type(dynamodb)(client=dynamodb.meta.client) if isinstance(dynamodb, ServiceResource) else dynamodb
+        )
+    return dynamodb_local.resource
+
+def get_bedrock():
+    """Shared bedrock-runtime client, created on first use"""
+    global bedrock
+    if bedrock is None:
+        with clients_lock:
+            if bedrock is None:
+                bedrock = boto3.client('bedrock-runtime', config=client_config('BEDROCK', 20, 2, 30, 3))
+    return bedrock
+
+# Hedged Bedrock calls (see RequestHedger): the second leg goes to HEDGE_REGION, or to the
+# cross-region inference profile HEDGE_PROFILE_PREFIX + model id in this region
+HEDGE_ENABLED = os.environ.get('HEDGE_ENABLED', 'false').lower() == 'true'
+HEDGE_REGION = os.environ.get('HEDGE_REGION', '')
+HEDGE_PROFILE_PREFIX = os.environ.get('HEDGE_PROFILE_PREFIX', '')
+hedge_bedrock = None
+
+def get_hedge_bedrock():
+    """bedrock-runtime client for the hedge leg (the shared client unless HEDGE_REGION is set)"""
+    global hedge_bedrock
+    if not HEDGE_REGION:
+        return get_bedrock()
+    if hedge_bedrock is None:
+        with clients_lock:
+            if hedge_bedrock is None:
+                hedge_bedrock = boto3.client(
+                    'bedrock-runtime', region_name=HEDGE_REGION, config=client_config('BEDROCK', 20, 2, 30, 3)
+                )
+    return hedge_bedrock
+
+if not LAZY_CLIENTS:
+    get_dynamodb()
+    get_bedrock()
+
+# Errors that mean Bedrock is overloaded or unreachable (as opposed to a bad request)
+BEDROCK_OVERLOAD_ERRORS = {
+    'ThrottlingException',
+    'ServiceUnavailableException',
+    'ModelNotReadyException',
+    'ModelTimeoutException',
+    'InternalServerException'
+}
+
+# Errors on which a request moves on to the segment's next model (same guardrail)
+MODEL_FALLBACK_ERRORS = {
+    'ThrottlingException',
+    'ServiceUnavailableException',
+    'ModelNotReadyException'
+}
+
+DEGRADED_MESSAGE = "The assistant is experiencing high demand right now. Please try again in a moment."
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling Bedrock while the circuit breaker is open"""
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker. After failure_threshold overload
+    errors in a row the circuit opens and calls fail fast for reset_seconds;
+    then a single trial call is let through (half-open) to probe recovery.
+    """
+
+    def __init__(self, failure_threshold, reset_seconds):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = 'closed'
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.trial_in_flight = False
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.failures = 0
+        self.short_circuits = 0
+        self.retries = 0
+
+    def before_call(self):
+        with self._lock:
+            if self.state == 'open' and time.monotonic() - self.opened_at >= self.reset_seconds:
+                self.state = 'half_open'
+            if self.state == 'open' or (self.state == 'half_open' and self.trial_in_flight):
+                self.short_circuits += 1
+                raise CircuitOpenError('Bedrock circuit breaker is open')
+            if self.state == 'half_open':
+                self.trial_in_flight = True
+            self.calls += 1
+
+    def record_success(self, retry_attempts=0):
+        with self._lock:
+            self.retries += retry_attempts
+            self.consecutive_failures = 0
+            self.trial_in_flight = False
+            self.state = 'closed'
+
+    def record_failure(self, overloaded, retry_attempts=0):
+        with self._lock:
+            self.retries += retry_attempts
+            self.failures += 1
+            self.trial_in_flight = False
+            if not overloaded:
+                # Bad requests say nothing about Bedrock health
+                if self.state == 'half_open':
+                    self.state = 'closed'
+                return
+            self.consecutive_failures += 1
+            if self.state == 'half_open' or self.consecutive_failures >= self.failure_threshold:
+                if self.state != 'open':
+                    logger.error(f"Bedrock circuit opened after {self.consecutive_failures} consecutive failures")
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'state': self.state,
+                'consecutive_failures': self.consecutive_failures,
+                'calls': self.calls,
+                'failures': self.failures,
+                'short_circuits': self.short_circuits,
+                'retries': self.retries
+            }
+
+# One breaker per model: throttling on one model must not short-circuit its fallbacks
+BREAKER_FAILURE_THRESHOLD = int(os.environ.get('BEDROCK_BREAKER_FAILURE_THRESHOLD', '5'))
+BREAKER_RESET_SECONDS = float(os.environ.get('BEDROCK_BREAKER_RESET_SECONDS', '30'))
+bedrock_breakers = {}
+breakers_lock = threading.Lock()
+
+def get_bedrock_breaker(model_id):
+    breaker = bedrock_breakers.get(model_id)
+    if breaker is None:
+        with breakers_lock:
+            breaker = bedrock_breakers.setdefault(
+                model_id, CircuitBreaker(BREAKER_FAILURE_THRESHOLD, BREAKER_RESET_SECONDS)
+            )
+    return breaker
+
+def new_call_stats():
+    """Per-request Bedrock counters, filled in by invoke_bedrock and emitted as metrics"""
+    return {'retries': 0, 'short_circuits': 0}
+
+def merge_call_stats(*call_stats):
+    """Sum the counters of calls made on separate threads (hedge legs)"""
+    return {name: sum(stats[name] for stats in call_stats) for name in new_call_stats()}
+
+def invoke_bedrock(operation, client=None, breaker_key=None, call_stats=None, **kwargs):
+    """
+    Call a bedrock-runtime operation through the model's circuit breaker,
+    counting retries. call_stats (from new_call_stats) also collects the
+    retries and short-circuits of this one request.
+    """
+    call_stats = call_stats if call_stats is not None else new_call_stats()
+    bedrock_breaker = get_bedrock_breaker(breaker_key or kwargs.get('modelId'))
+    try:
+        bedrock_breaker.before_call()
+    except CircuitOpenError:
+        call_stats['short_circuits'] += 1
+        raise
+    try:
+        response = getattr(client or get_bedrock(), operation)(**kwargs)
+    except ClientError as e:
+        retry_attempts = e.response.get('ResponseMetadata', {}).get('RetryAttempts', 0)
+        call_stats['retries'] += retry_attempts
+        bedrock_breaker.record_failure(
+            e.response.get('Error', {}).get('Code') in BEDROCK_OVERLOAD_ERRORS, retry_attempts
+        )
+        raise
+    except (ConnectTimeoutError, ReadTimeoutError, EndpointConnectionError):
+        bedrock_breaker.record_failure(True)
+        raise
+    except Exception:
+        bedrock_breaker.record_failure(False)
+        raise
+    retry_attempts = response.get('ResponseMetadata', {}).get('RetryAttempts', 0)
+    call_stats['retries'] += retry_attempts
+    bedrock_breaker.record_success(retry_attempts)
+    return response
+
+def get_bedrock_client_stats():
+    """Per-model circuit breaker state plus call, failure, short-circuit and retry counters"""
+    with breakers_lock:
+        breakers = dict(bedrock_breakers)
+    return {model_id: breaker.stats() for model_id, breaker in breakers.items()}
+
+def record_response_metrics(trace, bedrock_response):
+    """Counts for one answered query: Bedrock retries and breakers, cache hit or miss, hedging"""
+    record_bedrock_metrics(trace, bedrock_response)
+    # Only cache lookups count: bypassed follow-ups and pre-screened queries carry no cache_hit
+    if 'cache_hit' in bedrock_response:
+        trace.count('CacheHit', int(bedrock_response['cache_hit']))
+        trace.count('CacheMiss', int(not bedrock_response['cache_hit']))
+    if bedrock_response.get('hedged'):
+        trace.count('HedgedRequests')
+        trace.count('HedgeWins', int(bedrock_response['hedge_leg'] == 'hedge'))
+
+def record_bedrock_metrics(trace, bedrock_response):
+    """Retries and short-circuits of this request plus the container's open breakers, as EMF counts"""
+    call_stats = bedrock_response.get('call_stats') or new_call_stats()
+    trace.count('BedrockRetries', call_stats['retries'])
+    trace.count('BreakerShortCircuits', call_stats['short_circuits'])
+    # Gauge: Maximum over a period shows whether any model's circuit was open
+    trace.count('BreakersOpen', sum(
+        1 for stats in get_bedrock_client_stats().values() if stats['state'] == 'open'
+    ))
+
+def invoke_routed_model(operation, routing, call_stats=None, **kwargs):
+    """
+    Call the segment's model, moving on to its fallback models while a model is
+    throttled, unavailable or short-circuited. Every attempt carries the same
+    guardrail arguments. Returns (response, model_id); the last model's error
+    is raised when all of them fail.
+    """
+    model_ids = routing['model_ids']
+    for index, model_id in enumerate(model_ids):
+        try:
+            return invoke_bedrock(operation, call_stats=call_stats, modelId=model_id, **kwargs), model_id
+        except CircuitOpenError:
+            if index == len(model_ids) - 1:
+                raise
+        except ClientError as e:
+            code = e.response.get('Error', {}).get('Code')
+            if code not in MODEL_FALLBACK_ERRORS or index == len(model_ids) - 1:
+                raise
+            logger.warning(f"{model_id} unavailable ({code}), falling back to {model_ids[index + 1]}")
+
+class RequestHedger:
+    """
+    Hedged requests for tail latency: when the primary call has not answered
+    within the hedge_percentile of recent latencies for the same model and
+    output budget, a second leg is sent and whichever answers first wins. The
+    slower leg cannot be cancelled mid-call, so its result is discarded.
+    Hedges are capped by a token bucket that earns budget_percent / 100 of a
+    hedge per request, so at most that share of requests is ever doubled.
+    """
+
+    def __init__(self, enabled, percentile, window, min_samples, initial_delay_ms, min_delay_ms, max_delay_ms,
+                 budget_percent, max_workers):
+        self.enabled = enabled
+        self.percentile = percentile
+        self.window = window
+        self.min_samples = min_samples
+        self.initial_delay_ms = initial_delay_ms
+        self.min_delay_ms = min_delay_ms
+        self.max_delay_ms = max_delay_ms
+        self.budget_per_request = budget_percent / 100.0
+        self.budget_tokens = 0.0
+        self.latencies = {}
+        self._lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='hedge') if enabled else None
+        self.requests = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.budget_exhausted = 0
+
+    def record_latency(self, key, elapsed_ms):
+        with self._lock:
+            samples = self.latencies.get(key)
+            if samples is None:
+                samples = self.latencies[key] = deque(maxlen=self.window)
+            samples.append(elapsed_ms)
+
+    def delay_ms(self, key):
+        """Hedge delay: the configured percentile of recent primary latencies, clamped"""
+        with self._lock:
+            samples = sorted(self.latencies.get(key, ()))
+        if len(samples) < self.min_samples:
+            return self.initial_delay_ms
+        rank = max(1, int(round(self.percentile / 100.0 * len(samples))))
+        return min(self.max_delay_ms, max(self.min_delay_ms, samples[rank - 1]))
+
+    def try_acquire(self):
+        with self._lock:
+            if self.budget_tokens >= 1.0:
+                self.budget_tokens -= 1.0
+                self.hedged += 1
+                return True
+            self.budget_exhausted += 1
+            return False
+
+    def call(self, key, primary, hedge=None):
+        """
+        Run primary(), hedged with hedge() when it is slow. Returns
+        (result, winning_leg, hedged). When both legs fail the primary's
+        error is raised.
+        """
+        if not self.enabled:
+            return primary(), 'primary', False
+        with self._lock:
+            self.requests += 1
+            self.budget_tokens = min(10.0, self.budget_tokens + self.budget_per_request)
+        
+        started = time.perf_counter()
+        primary_future = self.executor.submit(primary)
+        # Latencies of every successful primary call (including slow ones that lost the race)
+        primary_future.add_done_callback(
+            lambda future: future.exception() is None
+            and self.record_latency(key, (time.perf_counter() - started) * 1000)
+        )
+        try:
+            return primary_future.result(timeout=self.delay_ms(key) / 1000.0), 'primary', False
+        except FutureTimeoutError:
+            pass
+        if hedge is None or not self.try_acquire():
+            return primary_future.result(), 'primary', False
+        
+        pending = {primary_future: 'primary', self.executor.submit(hedge): 'hedge'}
+        errors = {}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                leg = pending.pop(future)
+                if future.exception() is None:
+                    if leg == 'hedge':
+                        with self._lock:
+                            self.hedge_wins += 1
+                    return future.result(), leg, True
+                errors[leg] = future.exception()
+        raise errors['primary']
+
+    def stats(self):
+        with self._lock:
+            stats = {
+                'enabled': self.enabled,
+                'requests': self.requests,
+                'hedged': self.hedged,
+                'hedge_wins': self.hedge_wins,
+                'budget_exhausted': self.budget_exhausted
+            }
+            keys = list(self.latencies)
+        stats['delays_ms'] = {'/'.join(str(part) for part in key): self.delay_ms(key) for key in keys}
+        return stats
+
+request_hedger = RequestHedger(
+    enabled=HEDGE_ENABLED,
+    percentile=float(os.environ.get('HEDGE_PERCENTILE', '95')),
+    window=int(os.environ.get('HEDGE_WINDOW', '200')),
+    min_samples=int(os.environ.get('HEDGE_MIN_SAMPLES', '20')),
+    initial_delay_ms=float(os.environ.get('HEDGE_INITIAL_DELAY_MS', '3000')),
+    min_delay_ms=float(os.environ.get('HEDGE_MIN_DELAY_MS', '250')),
+    max_delay_ms=float(os.environ.get('HEDGE_MAX_DELAY_MS', '10000')),
+    budget_percent=float(os.environ.get('HEDGE_BUDGET_PERCENT', '5')),
+    max_workers=int(os.environ.get('HEDGE_MAX_WORKERS', '8'))
+)
+
+def get_hedge_stats():
+    """Hedged request counters and the current hedge delay per model and output budget"""
+    return request_hedger.stats()
+
+class TTLCache:
+    """
+    Bounded LRU cache with a per-entry TTL and hit/miss/eviction counters.
+    Instances live at module level so they survive across warm invocations.
+    """
+
+    def __init__(self, max_entries, ttl_seconds):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self.evictions += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(value)
+
+    def put(self, key, value):
+        if self.max_entries <= 0 or self.ttl_seconds <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, dict(value))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key=None):
+        """Drop one entry, or everything when no key is given"""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl_seconds,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
+
+# Warm-container profile cache (set PROFILE_CACHE_MAX_ENTRIES=0 to disable)
+profile_cache = TTLCache(
+    max_entries=int(os.environ.get('PROFILE_CACHE_MAX_ENTRIES', '1000')),
+    ttl_seconds=int(os.environ.get('PROFILE_CACHE_TTL_SECONDS', '300'))
+)
+
+# Reused across warm invocations for the concurrent pre-model stage
+prefetch_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get('PREFETCH_MAX_WORKERS', '4')),
+    thread_name_prefix='prefetch'
+)
+
+# Batch requests: max queries per request and concurrent model calls per container
+BATCH_MAX_QUERIES = int(os.environ.get('BATCH_MAX_QUERIES', '20'))
+batch_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get('BATCH_MAX_CONCURRENCY', '4')),
+    thread_name_prefix='batch'
+)
+
+# Conversation state: one item per conversation_id holding the last few turns,
+# stored already truncated the way generate_context_aware_prompt uses them
+CONVERSATION_MAX_TURNS = int(os.environ.get('CONVERSATION_MAX_TURNS', '3'))
+CONVERSATION_RESPONSE_CHARS = int(os.environ.get('CONVERSATION_RESPONSE_CHARS', '200'))
+CONVERSATION_TTL_SECONDS = int(os.environ.get('CONVERSATION_TTL_SECONDS', str(24 * 60 * 60)))
+CONVERSATION_SAVE_ATTEMPTS = 3
+
+# Projected conversation state for turns handed to the audit queue but not written yet
+pending_conversations = TTLCache(max_entries=1000, ttl_seconds=300)
+
+# Idempotency-Key: one record per (user, key) holding an in-progress lease and then the
+# final response. Duplicates wait for it (below API Gateway's 29s integration timeout).
+IDEMPOTENCY_TABLE = os.environ.get('IDEMPOTENCY_TABLE')
+IDEMPOTENCY_TTL_SECONDS = int(os.environ.get('IDEMPOTENCY_TTL_SECONDS', str(24 * 60 * 60)))
+IDEMPOTENCY_LEASE_SECONDS = int(os.environ.get('IDEMPOTENCY_LEASE_SECONDS', '60'))
+IDEMPOTENCY_WAIT_SECONDS = float(os.environ.get('IDEMPOTENCY_WAIT_SECONDS', '25'))
+IDEMPOTENCY_POLL_SECONDS = float(os.environ.get('IDEMPOTENCY_POLL_SECONDS', '0.25'))
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+
+class RateLimitExceeded(Exception):
+    """A user or segment bucket is empty; retry_after is in whole seconds"""
+    
+    def __init__(self, scope, retry_after):
+        super().__init__(f"{scope} rate limit exceeded")
+        self.scope = scope
+        self.retry_after = retry_after
+
+class RateLimiter:
+    """
+    Token buckets in GCRA form: each bucket is one "theoretical arrival time"
+    (tat, epoch ms) advanced by 60000 / per_minute per request, and a request
+    is allowed while tat stays within burst intervals of now. The shared state
+    lives in DynamoDB and each acquire is one conditional update_item. The
+    in-memory copy of every bucket rejects requests this container already
+    knows are over the limit without a round trip. If the table cannot be
+    reached the limiter fails open to the in-memory buckets.
+    """
+    
+    MAX_LOCAL_BUCKETS = 10000
+    
+    def __init__(self, table_name, enabled=True):
+        self.table_name = table_name
+        self.enabled = enabled
+        self.local = {}
+        self.lock = threading.Lock()
+        self.counts = {'allowed': 0, 'limited': 0, 'local_rejections': 0, 'shared_errors': 0}
+    
+    def check(self, user_id, user_profile, batch_size=None):
+        """
+        Take one token from the user's bucket, then the segment's; raises
+        RateLimitExceeded. A batch is charged batch_size tokens in one acquire
+        against the user's separate batch bucket and the segment's, so it is
+        either admitted whole or rejected before any model call.
+        """
+        limits = resolve_policy(user_profile)['rate_limit']
+        if not self.enabled or not limits:
+            return
+        cost = batch_size or 1
+        # The user bucket goes first so a throttled user never spends the segment's tokens
+        if batch_size:
+            self.acquire(f"batch#{user_id}", 'batch', limits['batch_per_minute'], limits['batch_burst'], cost)
+        else:
+            self.acquire(f"user#{user_id}", 'user', limits['user_per_minute'], limits['user_burst'])
+        segment = f"{user_profile.get('age_group', 'adult')}#{user_profile.get('role', 'general')}"
+        self.acquire(f"segment#{segment}", 'segment', limits['segment_per_minute'], limits['segment_burst'], cost)
+        with self.lock:
+            self.counts['allowed'] += cost
+    
+    def acquire(self, key, scope, per_minute, burst, cost=1):
+        interval = 60000.0 / per_minute * cost
+        now = time.time() * 1000
+        # Latest tat that still leaves room for `cost` more requests
+        limit = now + burst * 60000.0 / per_minute - interval
+        
+        with self.lock:
+            known_tat = self.local.get(key, 0.0)
+        if known_tat > limit:
+            self.reject(scope, known_tat - limit, local=True)
+        
+        shared = self.acquire_shared(key, now, interval, limit, known_tat) if self.table_name else None
+        if shared is None:
+            tat = max(known_tat, now) + interval
+        else:
+            allowed, tat = shared
+            if not allowed:
+                # The shared bucket is empty; remember that so the next requests stay local
+                self.remember(key, tat, now)
+                self.reject(scope, tat - limit, local=False)
+        
+        self.remember(key, tat, now)
+    
+    def acquire_shared(self, key, now, interval, limit, known_tat):
+        """
+        One conditional update per attempt: "advance" adds an interval to a
+        bucket that is busy but not full, "reset" restarts an idle bucket at
+        now. The failed condition returns the stored tat, which decides the
+        next attempt. Returns (allowed, tat), or None if the table is
+        unavailable.
+        """
+        table = get_dynamodb().Table(self.table_name)
+        expires = int((limit + interval) / 1000) + 3600
+        mode = 'advance' if known_tat >= now else 'reset'
+        try:
+            for _ in range(3):
+                try:
+                    if mode == 'advance':
+                        response = table.update_item(
+                            Key={'bucket_key': key},
+                            UpdateExpression='SET tat = tat + :interval, #ttl = :ttl',
+                            ConditionExpression='tat BETWEEN :now AND :limit',
+                            ExpressionAttributeNames={'#ttl': 'ttl'},
+                            ExpressionAttributeValues={
+                                ':interval': int(interval), ':now': int(now), ':limit': int(limit), ':ttl': expires
+                            },
+                            ReturnValues='UPDATED_NEW',
+                            ReturnValuesOnConditionCheckFailure='ALL_OLD'
+                        )
+                        return True, float(response['Attributes']['tat'])
+                    table.update_item(
+                        Key={'bucket_key': key},
+                        UpdateExpression='SET tat = :tat, #ttl = :ttl',
+                        ConditionExpression='attribute_not_exists(tat) OR tat < :now',
+                        ExpressionAttributeNames={'#ttl': 'ttl'},
+                        ExpressionAttributeValues={':tat': int(now + interval), ':now': int(now), ':ttl': expires},
+                        ReturnValuesOnConditionCheckFailure='ALL_OLD'
+                    )
+                    return True, now + interval
+                except ClientError as e:
+                    if e.response.get('Error', {}).get('Code') != 'ConditionalCheckFailedException':
+                        raise
+                    stored = e.response.get('Item', {}).get('tat')
+                    # Low-level error responses carry the item in wire format
+                    stored_tat = float(stored['N'] if isinstance(stored, dict) else stored) if stored else 0.0
+                    if stored_tat > limit:
+                        return False, stored_tat
+                    mode = 'advance' if stored_tat >= now else 'reset'
+            # Lost every race against other containers: the bucket is under heavy contention
+            return False, limit + interval
+        except Exception as e:
+            logger.error(f"Rate limit table error, using local buckets: {e}")
+            with self.lock:
+                self.counts['shared_errors'] += 1
+            return None
+    
+    def remember(self, key, tat, now):
+        with self.lock:
+            if len(self.local) >= self.MAX_LOCAL_BUCKETS and key not in self.local:
+                self.local = {k: v for k, v in self.local.items() if v > now}
+            self.local[key] = max(tat, self.local.get(key, 0.0))
+    
+    def reject(self, scope, wait_ms, local):
+        with self.lock:
+            self.counts['limited'] += 1
+            if local:
+                self.counts['local_rejections'] += 1
+        raise RateLimitExceeded(scope, max(1, int(wait_ms / 1000) + 1))
+    
+    def stats(self):
+        with self.lock:
+            return dict(self.counts, local_buckets=len(self.local))
+
+# Per-user and per-segment limits in front of every model call (limits come from policy.json)
+rate_limiter = RateLimiter(
+    os.environ.get('RATE_LIMIT_TABLE'),
+    enabled=os.environ.get('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+)
+
+def get_rate_limit_stats():
+    """Allowed/limited counters, including requests rejected without a DynamoDB call"""
+    return rate_limiter.stats()
+
+class DynamoDBResponseCache:
+    """Response cache shared across containers, expired through DynamoDB TTL"""
+
+    def __init__(self, table_name, ttl_seconds):
+        self.table_name = table_name
+        self.ttl_seconds = ttl_seconds
+
+    def get(self, key):
+        try:
+            item = get_dynamodb().Table(self.table_name).get_item(Key={'cache_key': key}).get('Item')
+        except Exception as e:
+            logger.error(f"Response cache read error: {e}")
+            return None
+        # DynamoDB deletes expired items lazily, so check the TTL ourselves
+        if not item or int(item.get('ttl', 0)) <= int(time.time()):
+            return None
+        return json.loads(item['value'])
+
+    def put(self, key, value):
+        try:
+            get_dynamodb().Table(self.table_name).put_item(Item={
+                'cache_key': key,
+                'value': json.dumps(value),
+                'ttl': int(time.time()) + self.ttl_seconds
+            })
+        except Exception as e:
+            logger.error(f"Response cache write error: {e}")
+
+class TieredResponseCache:
+    """In-process LRU in front of a shared cache; shared hits warm the local tier"""
+
+    def __init__(self, local, shared):
+        self.local = local
+        self.shared = shared
+
+    def get(self, key):
+        value = self.local.get(key)
+        if value is None:
+            value = self.shared.get(key)
+            if value is not None:
+                self.local.put(key, value)
+        return value
+
+    def put(self, key, value):
+        self.local.put(key, value)
+        self.shared.put(key, value)
+
+def create_response_cache():
+    """Build the response cache backend from RESPONSE_CACHE_BACKEND (memory, dynamodb, tiered or none)"""
+    backend = os.environ.get('RESPONSE_CACHE_BACKEND', 'memory')
+    ttl_seconds = int(os.environ.get('RESPONSE_CACHE_TTL_SECONDS', '3600'))
+    table_name = os.environ.get('RESPONSE_CACHE_TABLE')
+    
+    if backend == 'none':
+        return None
+    local = TTLCache(
+        max_entries=int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES', '500')),
+        ttl_seconds=ttl_seconds
+    )
+    if backend in ('dynamodb', 'tiered') and not table_name:
+        logger.error(f"RESPONSE_CACHE_BACKEND={backend} needs RESPONSE_CACHE_TABLE - using in-process cache")
+        return local
+    if backend == 'dynamodb':
+        return DynamoDBResponseCache(table_name, ttl_seconds)
+    if backend == 'tiered':
+        return TieredResponseCache(local, DynamoDBResponseCache(table_name, ttl_seconds))
+    return local
+
+response_cache = create_response_cache()
+response_cache_stats = {'hits': 0, 'misses': 0, 'bypasses': 0}
+response_cache_lock = threading.Lock()
+
+def build_trie_pattern(node):
+    """Regex source for a character trie, factoring shared prefixes so matching cost does not grow with the rule count"""
+    branches = [re.escape(char) + build_trie_pattern(child) for char, child in sorted(node.items()) if char]
+    if not branches:
+        return ''
+    is_word_end = '' in node
+    if len(branches) == 1 and not is_word_end:
+        return branches[0]
+    pattern = '(?:' + '|'.join(branches) + ')'
+    # Greedy optional group: the longest correction wins, shorter ones on backtrack
+    return pattern + '?' if is_word_end else pattern
+
+def compile_trie_regex(terms, flags=0):
+    """Compile words/phrases into one whole-word regex built from a prefix trie"""
+    trie = {}
+    for term in terms:
+        node = trie
+        for char in term:
+            node = node.setdefault(char, {})
+        node[''] = True
+    return re.compile(r'\b' + build_trie_pattern(trie) + r'\b', flags)
+
+POLICY_FIELDS = ('template', 'guardrail', 'model_id', 'fallback_model_ids', 'max_tokens', 'history_tokens', 'rate_limit')
+RATE_LIMIT_KEYS = ('user_per_minute', 'user_burst', 'segment_per_minute', 'segment_burst',
+                   'batch_per_minute', 'batch_burst')
+PROFILE_DIMENSIONS = ('age_group', 'role', 'industry')
+
+def load_policy_config():
+    """Read the routing policy from POLICY_CONFIG (inline JSON) or POLICY_CONFIG_FILE"""
+    inline = os.environ.get('POLICY_CONFIG')
+    if inline:
+        return json.loads(inline)
+    path = os.environ.get('POLICY_CONFIG_FILE') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'policy.json')
+    with open(path) as f:
+        return json.load(f)
+
+def compile_policy_table(config):
+    """
+    Validate the policy config and compile its segments into a dict keyed by
+    (age_group, role, industry), where '*' stands for any value. Guardrail ids
+    are resolved from the environment here, once per cold start.
+    """
+    templates = config.get('templates', {})
+    defaults = config.get('defaults', {})
+    
+    # Templates are filled with str.format(query=...) on every request; any other
+    # placeholder or stray brace would fail there, so fail the cold start instead
+    for name, template in templates.items():
+        try:
+            template.format(query='')
+        except (KeyError, IndexError, ValueError, AttributeError) as e:
+            raise ValueError(f"Policy template {name!r} is not a valid query template: {e!r}")
+    
+    guardrails = {}
+    prescreens = {}
+    hedge_guardrail_ids = {}
+    for name, guardrail in config.get('guardrails', {}).items():
+        guardrails[name] = dict(
+            {
+                'guardrail_id': os.environ.get(guardrail['guardrail_id_env']),
+                'guardrail_version': str(guardrail['guardrail_version'])
+            },
+            **guardrail.get('metadata', {})
+        )
+        prescreens[name] = compile_prescreen(guardrail)
+        # Guardrails are regional: a hedge region needs its own copy (HEDGE_<guardrail_id_env>),
+        # and segments without one are never hedged there
+        hedge_guardrail_ids[name] = (
+            os.environ.get(f"HEDGE_{guardrail['guardrail_id_env']}") if HEDGE_REGION
+            else guardrails[name]['guardrail_id']
+        )
+    
+    table = {}
+    for segment in config.get('segments', []):
+        match = segment.get('match', {})
+        unknown = set(match) - set(PROFILE_DIMENSIONS)
+        if unknown:
+            raise ValueError(f"Policy segment matches on unknown fields: {sorted(unknown)}")
+        key = tuple(match.get(dimension, '*') for dimension in PROFILE_DIMENSIONS)
+        if key in table:
+            raise ValueError(f"Duplicate policy segment for {key}")
+        
+        rule = {field: segment[field] for field in POLICY_FIELDS if field in segment}
+        if 'template' in rule and rule['template'] not in templates:
+            raise ValueError(f"Policy segment {key} uses unknown template {rule['template']!r}")
+        if 'guardrail' in rule and rule['guardrail'] not in guardrails:
+            raise ValueError(f"Policy segment {key} uses unknown guardrail {rule['guardrail']!r}")
+        validate_models(key, rule)
+        if 'max_tokens' in rule and (not isinstance(rule['max_tokens'], int) or rule['max_tokens'] <= 0):
+            raise ValueError(f"Policy segment {key} has invalid max_tokens {rule['max_tokens']!r}")
+        if 'history_tokens' in rule and (not isinstance(rule['history_tokens'], int) or rule['history_tokens'] < 0):
+            raise ValueError(f"Policy segment {key} has invalid history_tokens {rule['history_tokens']!r}")
+        if rule.get('rate_limit') is not None:
+            validate_rate_limit(key, rule['rate_limit'])
+        table[key] = rule
+    
+    validate_models('defaults', defaults)
+    if defaults.get('rate_limit') is not None:
+        validate_rate_limit('defaults', defaults['rate_limit'])
+    
+    # The catch-all segment (plus defaults) must resolve every field
+    catch_all = dict(defaults, **table.get(('*', '*', '*'), {}))
+    missing = [field for field in POLICY_FIELDS if field not in catch_all]
+    if missing:
+        raise ValueError(f"Policy has no catch-all value for: {missing}")
+    
+    return {
+        'table': table,
+        'defaults': defaults,
+        'templates': templates,
+        'guardrails': guardrails,
+        'prescreens': prescreens,
+        'hedge_guardrail_ids': hedge_guardrail_ids
+    }
+
+def validate_models(key, rule):
+    """model_id is a Bedrock model id; fallback_model_ids lists the models tried, in order, when it is throttled"""
+    if 'model_id' in rule and (not isinstance(rule['model_id'], str) or not rule['model_id']):
+        raise ValueError(f"Policy {key} has invalid model_id {rule['model_id']!r}")
+    fallbacks = rule.get('fallback_model_ids', [])
+    if not isinstance(fallbacks, list) or not all(isinstance(model_id, str) and model_id for model_id in fallbacks):
+        raise ValueError(f"Policy {key} has invalid fallback_model_ids {fallbacks!r}")
+
+def validate_rate_limit(key, rate_limit):
+    """A rate_limit is either null (no limit) or positive numbers for every RATE_LIMIT_KEYS entry"""
+    if not isinstance(rate_limit, dict):
+        raise ValueError(f"Policy {key} has invalid rate_limit {rate_limit!r}")
+    for name in RATE_LIMIT_KEYS:
+        value = rate_limit.get(name)
+        if not isinstance(value, (int, float)) or value <= 0:
+            raise ValueError(f"Policy {key} has invalid rate_limit.{name} {value!r}")
+    if rate_limit['user_burst'] < 1 or rate_limit['segment_burst'] < 1:
+        raise ValueError(f"Policy {key} rate_limit bursts must allow at least one request")
+    # A batch is charged whole, so a full one must fit in both buckets it draws from
+    if min(rate_limit['batch_burst'], rate_limit['segment_burst']) < BATCH_MAX_QUERIES:
+        raise ValueError(f"Policy {key} rate_limit batch_burst and segment_burst must allow "
+                         f"BATCH_MAX_QUERIES ({BATCH_MAX_QUERIES}) queries")
+
+def compile_prescreen(guardrail):
+    """
+    Compile a guardrail's denied terms (mirroring its word policy in
+    advanced_guardrails.tf) into one case-insensitive multi-pattern matcher.
+    Returns None when the guardrail has no denied terms.
+    """
+    terms = [term.lower() for term in guardrail.get('denied_terms', []) if term.strip()]
+    if not terms:
+        return None
+    if not guardrail.get('blocked_input_message'):
+        raise ValueError(f"Guardrail {guardrail['guardrail_id_env']} has denied_terms but no blocked_input_message")
+    return {
+        'pattern': compile_trie_regex(terms, re.IGNORECASE),
+        'message': guardrail['blocked_input_message']
+    }
+
+def policy_lookup_keys(age_group, role, industry):
+    """Fallback order: age-specific segments first, then role/industry segments, then the catch-all"""
+    return [
+        (age_group, role, industry),
+        (age_group, role, '*'),
+        (age_group, '*', industry),
+        (age_group, '*', '*'),
+        ('*', role, industry),
+        ('*', role, '*'),
+        ('*', '*', industry),
+        ('*', '*', '*')
+    ]
+
+def build_policy(profile_key):
+    """Resolve each policy field independently along the fallback order"""
+    table = policy['table']
+    resolved = {}
+    for key in policy_lookup_keys(*profile_key):
+        for field, value in table.get(key, {}).items():
+            resolved.setdefault(field, value)
+    for field in POLICY_FIELDS:
+        resolved.setdefault(field, policy['defaults'].get(field))
+    
+    return {
+        'template_name': resolved['template'],
+        'template': policy['templates'][resolved['template']],
+        'guardrail_config': policy['guardrails'][resolved['guardrail']],
+        'prescreen': policy['prescreens'][resolved['guardrail']],
+        'hedge_guardrail_id': policy['hedge_guardrail_ids'][resolved['guardrail']],
+        'model_id': resolved['model_id'],
+        # Primary model first, then its fallbacks; the guardrail is the same for all of them
+        'model_ids': list(dict.fromkeys([resolved['model_id']] + resolved['fallback_model_ids'])),
+        'max_tokens': resolved['max_tokens'],
+        'history_tokens': resolved['history_tokens'],
+        'rate_limit': resolved['rate_limit']
+    }
+
+# Routing policy, loaded and validated once per cold start
+policy = compile_policy_table(load_policy_config())
+resolved_policies = {}
+
+def resolve_policy(user_profile):
+    """
+    Routing policy for a profile: prompt template, guardrail, model and its fallbacks, max_tokens,
+    the input token budget for conversation history and the rate limits.
+    Resolved policies are shared between requests and must be treated as read-only.
+    """
+    profile_key = (
+        user_profile.get('age_group', 'adult'),
+        user_profile.get('role', 'general'),
+        user_profile.get('industry', 'general')
+    )
+    resolved = resolved_policies.get(profile_key)
+    if resolved is None:
+        resolved = build_policy(profile_key)
+        if len(resolved_policies) < 1024:
+            resolved_policies[profile_key] = resolved
+    return resolved
 
 def lambda_handler(event, context):
     """
@@ -26,6 +1059,8 @@ def lambda_handler(event, context):
         if event.get('httpMethod') == 'OPTIONS':
             return cors_response(200, '')
         
+        trace = start_trace()
+        
         # Extract user from Cognito authorizer context (API Gateway handles JWT validation)
         user_id = get_user_from_context(event)
         if not user_id:
@@ -36,57 +1071,232 @@ def lambda_handler(event, context):
         if 'error' in body:
             return cors_response(400, body)
         
-        query = body.get('query', '').strip()
-        conversation_id = body.get('conversation_id')  # Optional for follow-ups
-        if not query or len(query) > 1000:
-            return cors_response(400, {'error': 'Invalid query'})
-        
-        # Auto-correct grammar if needed
-        corrected_query = auto_correct_grammar(query)
-        
-        # Get user profile
-        user_profile = get_user_profile(user_id)
-        if not user_profile:
-            return cors_response(404, {'error': 'User profile not found'})
-        
-        # Get conversation history for follow-ups
-        conversation_history = get_conversation_history(user_id, conversation_id) if conversation_id else []
+        # Retries carrying the same Idempotency-Key get the stored response instead of a new model call
+        idempotency_key = get_idempotency_key(event)
+        if idempotency_key is not None:
+            if not idempotency_key or len(idempotency_key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+                return cors_response(400, {'error': 'Invalid Idempotency-Key'})
+            if IDEMPOTENCY_TABLE:
+                return handle_idempotent_request(
+                    user_id, idempotency_key, body, lambda: handle_query_request(user_id, body, trace)
+                )
         
-        # Generate context-aware prompt with corrected query
-        prompt = generate_context_aware_prompt(corrected_query, user_profile, conversation_history)
-        
-        # Call Bedrock with dynamically selected guardrails
-        bedrock_response = call_bedrock_with_guardrails(prompt, user_profile)
-        response = bedrock_response['content']
-        guardrail_config = bedrock_response['guardrail_config']
-        
-        # Log for audit and save conversation
-        conversation_id = conversation_id or f"{user_id}-{int(datetime.now().timestamp())}"
-        log_interaction(user_id, query, response, user_profile)
-        save_conversation_turn(user_id, conversation_id, query, response)
+        return handle_query_request(user_id, body, trace)
         
-        return cors_response(200, {
-            'response': response,
-            'conversation_id': conversation_id,
-            'original_query': query,
-            'corrected_query': corrected_query if corrected_query != query else None,
-            'metadata': {
-                'user_id': user_id,
-                'age_group': user_profile.get('age_group', 'unknown'),
-                'role': user_profile.get('role', 'unknown'),
-                'industry': user_profile.get('industry', 'unknown'),
-                'device': user_profile.get('device', 'desktop'),
-                'guardrail_applied': True,
-                'guardrail_config': guardrail_config,  # Show which guardrail was used
-                'grammar_corrected': corrected_query != query,
-                'timestamp': datetime.now().isoformat()
-            }
-        })
+    except RateLimitExceeded as e:
+        logger.warning(f"Rate limited {user_id}: {e}")
+        return rate_limited_response(e)
         
     except Exception as e:
         logger.error(f"Error: {str(e)}", exc_info=True)
         return cors_response(500, {'error': 'Internal server error'})
 
+def handle_query_request(user_id, body, trace=NULL_TRACE):
+    """Answer one validated request body (single or batch). Raises RateLimitExceeded."""
+    # Batch shape: {"queries": [...]} answered for one user in a single invocation
+    if 'queries' in body:
+        return handle_batch_request(user_id, body.get('queries'), trace)
+    
+    query = body.get('query', '').strip()
+    conversation_id = body.get('conversation_id')  # Optional for follow-ups
+    if not query or len(query) > 1000:
+        return cors_response(400, {'error': 'Invalid query'})
+    # The python runtime behind the REST API cannot deliver a response incrementally
+    if body.get('stream'):
+        return cors_response(400, {'error': 'Streaming responses are not supported'})
+    
+    # Grammar correction, profile lookup and conversation history run concurrently
+    corrected_query, user_profile, conversation_state = prepare_request_context(
+        user_id, query, conversation_id, trace
+    )
+    if not user_profile:
+        return cors_response(404, {'error': 'User profile not found'})
+    conversation_history = conversation_state['turns']
+    
+    # Generate context-aware prompt with corrected query
+    with trace.span('generate_context_aware_prompt'):
+        prompt = generate_context_aware_prompt(corrected_query, user_profile, conversation_history)
+    
+    # Local pre-screen: queries that hit a guardrail's denied terms never reach Bedrock
+    prescreened = prescreen_query(corrected_query, user_profile)
+    
+    # Call Bedrock with dynamically selected guardrails (repeated stand-alone questions are cached)
+    if prescreened:
+        bedrock_response = prescreened
+    else:
+        with trace.span('call_bedrock_with_guardrails'):
+            bedrock_response = call_bedrock_cached(corrected_query, prompt, user_profile, conversation_history)
+    response = bedrock_response['content']
+    guardrail_config = bedrock_response['guardrail_config']
+    
+    # Audit record and conversation turn, persisted as one event
+    conversation_id = conversation_id or new_conversation_id(user_id)
+    with trace.span('record_turn'):
+        record_turn(user_id, conversation_id, query, response, user_profile, conversation_state,
+                    prescreen_term=bedrock_response.get('prescreen_term'))
+    
+    record_response_metrics(trace, bedrock_response)
+    trace.emit(
+        user_profile.get('age_group'), guardrail_config.get('protection_level'), bedrock_response.get('model_id'),
+        cache_hit=bedrock_response.get('cache_hit', False), prescreened=bool(prescreened),
+        hedge_leg=bedrock_response.get('hedge_leg')
+    )
+    
+    return cors_response(200, {
+        'response': response,
+        'conversation_id': conversation_id,
+        'original_query': query,
+        'corrected_query': corrected_query if corrected_query != query else None,
+        'metadata': dict(
+            build_response_metadata(user_id, user_profile, guardrail_config, corrected_query != query),
+            cache_hit=bedrock_response.get('cache_hit', False),
+            prescreened=bool(prescreened),
+            degraded=bedrock_response.get('degraded', False),
+            guardrail_action=bedrock_response.get('guardrail_action', 'NONE'),
+            model_id=bedrock_response.get('model_id'),
+            hedged=bedrock_response.get('hedged', False),
+            hedge_leg=bedrock_response.get('hedge_leg')
+        )
+    })
+
+def handle_batch_request(user_id, queries, trace=NULL_TRACE):
+    """
+    Answer up to BATCH_MAX_QUERIES stand-alone questions for one user.
+    The profile is resolved once, model calls run concurrently on the bounded
+    batch executor, results keep the request order with per-item errors, and
+    all audit records are published together (audit-only turn events).
+    Emits one EMF line per batch: per-item stage latencies as value arrays,
+    counts summed over the items and BatchLatency for the whole batch.
+    """
+    if not isinstance(queries, list) or not queries or len(queries) > BATCH_MAX_QUERIES:
+        return cors_response(400, {'error': f'queries must be a list of 1-{BATCH_MAX_QUERIES} questions'})
+    
+    with trace.span('get_user_profile'):
+        user_profile = get_user_profile(user_id)
+    if not user_profile:
+        return cors_response(404, {'error': 'User profile not found'})
+    routing = resolve_policy(user_profile)
+    trace.count('BatchQueries', len(queries))
+    
+    # The whole batch is admitted or rejected up front, never cut off part way
+    try:
+        rate_limiter.check(user_id, user_profile, batch_size=len(queries))
+    except RateLimitExceeded:
+        trace.count('RateLimited')
+        trace.emit(user_profile.get('age_group'), routing['guardrail_config'].get('protection_level'),
+                   latency_metric='BatchLatency', batch=True)
+        raise
+    
+    item_traces = [start_trace() for _ in queries]
+    futures = [
+        batch_executor.submit(answer_batch_item, query, user_profile, item_trace)
+        for query, item_trace in zip(queries, item_traces)
+    ]
+    
+    results = []
+    events = []
+    batch_id = new_interaction_id(user_id)
+    for index, future in enumerate(futures):
+        query = queries[index]
+        try:
+            result = future.result()
+        except Exception as e:
+            logger.error(f"Batch item {index} error: {e}", exc_info=True)
+            result = {'error': 'Internal server error'}
+        trace.merge(item_traces[index])
+        trace.count('BatchItemErrors', int('error' in result))
+        
+        result['index'] = index
+        results.append(result)
+        if 'response' in result:
+            events.append({
+                'audit': build_audit_item(
+                    f"{batch_id}-{index}", user_id, query, result['response'], user_profile,
+                    prescreen_term=result.pop('prescreen_term', None)
+                ),
+                'conversation': None
+            })
+    
+    if events:
+        with trace.span('record_turn'):
+            publish_turn_events(events)
+    
+    # ModelId is the segment's primary model; fallback answers are counted under it
+    trace.emit(user_profile.get('age_group'), routing['guardrail_config'].get('protection_level'), routing['model_id'],
+               latency_metric='BatchLatency', batch=True)
+    
+    return cors_response(200, {
+        'results': results,
+        'metadata': build_response_metadata(user_id, user_profile, select_guardrail_configuration(user_profile), False)
+    })
+
+def answer_batch_item(query, user_profile, trace=NULL_TRACE):
+    """Run one batch question through the same pipeline as a single request (without history)"""
+    if not isinstance(query, str) or not query.strip() or len(query.strip()) > 1000:
+        return {'error': 'Invalid query'}
+    query = query.strip()
+    
+    with trace.span('auto_correct_grammar'):
+        corrected_query = auto_correct_grammar(query)
+    with trace.span('generate_context_aware_prompt'):
+        prompt = generate_context_aware_prompt(corrected_query, user_profile)
+    bedrock_response = prescreen_query(corrected_query, user_profile)
+    if not bedrock_response:
+        with trace.span('call_bedrock_with_guardrails'):
+            bedrock_response = call_bedrock_cached(corrected_query, prompt, user_profile, [], rate_limited=False)
+    record_response_metrics(trace, bedrock_response)
+    if 'error' in bedrock_response['guardrail_config']:
+        return {'error': bedrock_response['content']}
+    
+    return {
+        'response': bedrock_response['content'],
+        'original_query': query,
+        'corrected_query': corrected_query if corrected_query != query else None,
+        'cache_hit': bedrock_response.get('cache_hit', False),
+        'prescreen_term': bedrock_response.get('prescreen_term')
+    }
+
+def build_response_metadata(user_id, user_profile, guardrail_config, grammar_corrected):
+    """Metadata returned to the client alongside every model response"""
+    return {
+        'user_id': user_id,
+        'age_group': user_profile.get('age_group', 'unknown'),
+        'role': user_profile.get('role', 'unknown'),
+        'industry': user_profile.get('industry', 'unknown'),
+        'device': user_profile.get('device', 'desktop'),
+        'guardrail_applied': True,
+        'guardrail_config': guardrail_config,  # Show which guardrail was used
+        'grammar_corrected': grammar_corrected,
+        'timestamp': datetime.now().isoformat()
+    }
+
+def prepare_request_context(user_id, query, conversation_id, trace=NULL_TRACE):
+    """
+    Concurrent pre-model stage: the DynamoDB reads for the profile and the
+    conversation state are independent, so they are issued in parallel on the
+    shared executor while grammar correction runs on the calling thread.
+    Returns (corrected_query, user_profile, conversation_state).
+    """
+    profile_future = prefetch_executor.submit(trace.timed('get_user_profile', get_user_profile), user_id)
+    if bedrock is None:
+        # Cold container: build the Bedrock client while the DynamoDB reads are in flight
+        prefetch_executor.submit(get_bedrock)
+    state_future = (
+        prefetch_executor.submit(
+            trace.timed('get_conversation_state', get_conversation_state), user_id, conversation_id
+        )
+        if conversation_id else None
+    )
+    
+    # Auto-correct grammar if needed
+    with trace.span('auto_correct_grammar'):
+        corrected_query = auto_correct_grammar(query)
+    
+    user_profile = profile_future.result()
+    conversation_state = state_future.result() if state_future else empty_conversation_state()
+    
+    return corrected_query, user_profile, conversation_state
+
 def get_user_from_context(event):
     """Extract user ID from Cognito authorizer context"""
     try:
@@ -117,10 +1327,147 @@ def parse_request_body(event):
     except json.JSONDecodeError:
         return {'error': 'Invalid JSON'}
 
+def get_idempotency_key(event):
+    """Idempotency-Key header value (header names are case-insensitive), or None"""
+    for name, value in (event.get('headers') or {}).items():
+        if name.lower() == 'idempotency-key':
+            return (value or '').strip()
+    return None
+
+def handle_idempotent_request(user_id, idempotency_key, body, process):
+    """
+    Run process() at most once per (user, Idempotency-Key). The first request
+    claims the key with an in-progress lease; duplicates replay the stored
+    response, or poll for it while the first is still running. Failed or
+    rate-limited attempts release the key so the client's retry runs again,
+    and a lease left by a crashed invocation is taken over once it expires.
+    """
+    record_key = f"{user_id}#{idempotency_key}"
+    fingerprint = hashlib.sha256(json.dumps(body, sort_keys=True).encode('utf-8')).hexdigest()
+    owner = uuid.uuid4().hex
+    deadline = time.monotonic() + IDEMPOTENCY_WAIT_SECONDS
+    
+    while True:
+        record = claim_idempotency_record(record_key, fingerprint, owner)
+        if record is None:
+            break
+        if record.get('fingerprint') != fingerprint:
+            return cors_response(422, {'error': 'Idempotency-Key was already used for a different request'})
+        if record.get('status') == 'COMPLETED':
+            return replay_response(record['response'])
+        if time.monotonic() >= deadline:
+            response = cors_response(409, {'error': 'A request with this Idempotency-Key is still in progress'})
+            response['headers']['Retry-After'] = '1'
+            response['headers']['Access-Control-Expose-Headers'] = 'Retry-After'
+            return response
+        time.sleep(IDEMPOTENCY_POLL_SECONDS)
+    
+    try:
+        response = process()
+    except Exception:
+        release_idempotency_record(record_key, owner)
+        raise
+    if response['statusCode'] >= 500 or response['statusCode'] == 429:
+        release_idempotency_record(record_key, owner)
+    else:
+        complete_idempotency_record(record_key, owner, response)
+    return response
+
+def claim_idempotency_record(record_key, fingerprint, owner):
+    """
+    Conditionally create the in-progress record (or take over an expired lease).
+    Returns None when this invocation now owns the key, otherwise the existing record.
+    """
+    table = get_dynamodb().Table(IDEMPOTENCY_TABLE)
+    now = int(time.time())
+    try:
+        table.put_item(
+            Item={
+                'idempotency_key': record_key,
+                'status': 'IN_PROGRESS',
+                'fingerprint': fingerprint,
+                'owner': owner,
+                'lease_expires': now + IDEMPOTENCY_LEASE_SECONDS,
+                'ttl': now + IDEMPOTENCY_TTL_SECONDS
+            },
+            ConditionExpression='attribute_not_exists(idempotency_key) OR (#status = :in_progress AND lease_expires < :now)',
+            ExpressionAttributeNames={'#status': 'status'},
+            ExpressionAttributeValues={':in_progress': 'IN_PROGRESS', ':now': now}
+        )
+        return None
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') != 'ConditionalCheckFailedException':
+            raise
+    record = table.get_item(Key={'idempotency_key': record_key}, ConsistentRead=True).get('Item')
+    # Released between the put and the read: report it as in progress so the caller claims again
+    return record or {'fingerprint': fingerprint, 'status': 'IN_PROGRESS'}
+
+def complete_idempotency_record(record_key, owner, response):
+    """Store the final response for replay (only while this invocation still owns the lease)"""
+    try:
+        get_dynamodb().Table(IDEMPOTENCY_TABLE).update_item(
+            Key={'idempotency_key': record_key},
+            UpdateExpression='SET #status = :completed, #response = :response, #ttl = :ttl REMOVE lease_expires',
+            ConditionExpression='#owner = :owner',
+            ExpressionAttributeNames={'#status': 'status', '#response': 'response', '#ttl': 'ttl', '#owner': 'owner'},
+            ExpressionAttributeValues={
+                ':completed': 'COMPLETED',
+                ':response': {
+                    'statusCode': response['statusCode'],
+                    'headers': response['headers'],
+                    'body': response['body']
+                },
+                ':ttl': int(time.time()) + IDEMPOTENCY_TTL_SECONDS,
+                ':owner': owner
+            }
+        )
+    except Exception as e:
+        logger.error(f"Error storing idempotent response: {e}")
+        release_idempotency_record(record_key, owner)
+
+def release_idempotency_record(record_key, owner):
+    """Drop this invocation's in-progress record so a retry runs the request again"""
+    try:
+        get_dynamodb().Table(IDEMPOTENCY_TABLE).delete_item(
+            Key={'idempotency_key': record_key},
+            ConditionExpression='#owner = :owner',
+            ExpressionAttributeNames={'#owner': 'owner'},
+            ExpressionAttributeValues={':owner': owner}
+        )
+    except Exception as e:
+        logger.error(f"Error releasing idempotency record: {e}")
+
+def replay_response(stored):
+    """API Gateway response rebuilt from a stored record (DynamoDB returns numbers as Decimal)"""
+    headers = dict(stored['headers'], **{'Idempotent-Replayed': 'true'})
+    headers['Access-Control-Expose-Headers'] = ','.join(
+        filter(None, [headers.get('Access-Control-Expose-Headers'), 'Idempotent-Replayed'])
+    )
+    return {'statusCode': int(stored['statusCode']), 'headers': headers, 'body': stored['body']}
+
 def get_user_profile(user_id):
+    """Get user profile, served from the warm-container cache when possible"""
+    profile = profile_cache.get(user_id)
+    if profile is not None and age_group_current(profile, current_date()):
+        return profile
+    
+    profile = load_user_profile(user_id)
+    if profile:
+        profile_cache.put(user_id, profile)
+    return profile
+
+def invalidate_user_profile(user_id=None):
+    """Invalidate cached profile(s) after a profile is changed"""
+    profile_cache.invalidate(user_id)
+
+def get_profile_cache_stats():
+    """Hit, miss and eviction counters for sizing the profile cache"""
+    return profile_cache.stats()
+
+def load_user_profile(user_id):
     """Get user profile from DynamoDB"""
     try:
-        table = dynamodb.Table(os.environ['USER_TABLE'])
+        table = get_dynamodb().Table(os.environ['USER_TABLE'])
         response = table.get_item(Key={'user_id': user_id})
         
         if 'Item' not in response:
@@ -128,22 +1475,9 @@ def get_user_profile(user_id):
             
         profile = response['Item']
         
-        # Calculate age group from birth_date
-        if 'birth_date' in profile:
-            try:
-                birth_date = datetime.strptime(profile['birth_date'], '%Y-%m-%d')
-                age = (datetime.now() - birth_date).days // 365
-                
-                if age < 13:
-                    profile['age_group'] = 'child'
-                elif age < 18:
-                    profile['age_group'] = 'teen'
-                elif age < 65:
-                    profile['age_group'] = 'adult'
-                else:
-                    profile['age_group'] = 'senior'
-            except:
-                profile['age_group'] = 'adult'
+        # age_group is materialized at write time; recompute only once it has expired
+        if 'birth_date' in profile and not age_group_current(profile, current_date()):
+            materialize_age_group(table, profile)
         
         return profile
         
@@ -151,43 +1485,175 @@ def get_user_profile(user_id):
         logger.error(f"Error getting user profile: {e}")
         return None
 
+# Age group boundaries: under 13 child (COPPA), under 18 teen, under 65 adult, then senior.
+# Keep in sync with web-demo/auth_server.py, which materializes the group at write time.
+AGE_GROUP_BOUNDARIES = ((13, 'child'), (18, 'teen'), (65, 'adult'))
+
+def current_date():
+    return datetime.now(timezone.utc).date()
+
+def birthday_in_year(birth_date, year):
+    """Anniversary of birth_date in `year`; 29 February falls on 1 March in common years"""
+    try:
+        return birth_date.replace(year=year)
+    except ValueError:
+        return date(year, 3, 1)
+
+def compute_age_group(birth_date, today):
+    """
+    Exact age group on `today` and the date it next changes (None for senior).
+    The group only changes on the birthday that reaches the next boundary.
+    """
+    for years, group in AGE_GROUP_BOUNDARIES:
+        boundary = birthday_in_year(birth_date, birth_date.year + years)
+        if today < boundary:
+            return group, boundary
+    return 'senior', None
+
+def parse_birth_date(value):
+    """birth_date as a date, or None when missing or not YYYY-MM-DD"""
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        return None
+
+def age_group_current(profile, today):
+    """
+    True while the stored age_group is still valid. A group without an expiry
+    is final: senior, a group set explicitly without a birth_date, and the
+    'adult' fallback for an unparseable birth_date never change on recompute.
+    """
+    group = profile.get('age_group')
+    if not group:
+        return 'birth_date' not in profile
+    expires = profile.get('age_group_expires')
+    if expires:
+        return today.isoformat() < expires
+    return group == 'senior' or parse_birth_date(profile.get('birth_date')) is None
+
+def materialize_age_group(table, profile):
+    """
+    Recompute an expired (or legacy, never stored) age_group in place and
+    write it back, conditioned on birth_date so a concurrent profile edit wins.
+    """
+    birth_date = parse_birth_date(profile['birth_date'])
+    if birth_date is None:
+        profile['age_group'] = 'adult'
+        return
+    
+    group, expires = compute_age_group(birth_date, current_date())
+    profile['age_group'] = group
+    values = {':group': group, ':birth_date': profile['birth_date']}
+    if expires:
+        profile['age_group_expires'] = expires.isoformat()
+        values[':expires'] = profile['age_group_expires']
+        update = 'SET age_group = :group, age_group_expires = :expires'
+    else:
+        profile.pop('age_group_expires', None)
+        update = 'SET age_group = :group REMOVE age_group_expires'
+    
+    try:
+        table.update_item(
+            Key={'user_id': profile['user_id']},
+            UpdateExpression=update,
+            ConditionExpression='birth_date = :birth_date',
+            ExpressionAttributeValues=values
+        )
+    except Exception as e:
+        logger.error(f"Error storing age group for {profile['user_id']}: {e}")
+
+def select_prompt_template(user_profile):
+    """Prompt template name for an age/role/industry combination"""
+    return resolve_policy(user_profile)['template_name']
+
+def estimate_tokens(text):
+    """Cheap local token estimate (~4 characters per token for English text)"""
+    return (len(text) + 3) // 4
+
+def build_history_context(conversation_history, budget_tokens):
+    """
+    Fit recent turns into budget_tokens, newest first. The newest turn that
+    does not fit whole gets its answer shortened to the remaining budget;
+    anything older is dropped. Returns the turns' text in chronological order.
+    """
+    entries = []
+    remaining = budget_tokens
+    for turn in reversed(conversation_history[-CONVERSATION_MAX_TURNS:]):
+        question = f"Q: {turn['query']}\nA: "
+        answer = turn['response'][:CONVERSATION_RESPONSE_CHARS]
+        cost = estimate_tokens(question + answer + "...\n\n")
+        if cost > remaining:
+            answer_chars = (remaining - estimate_tokens(question + "...\n\n")) * 4
+            if answer_chars > 0:
+                entries.append(question + answer[:answer_chars] + "...\n\n")
+            break
+        entries.append(question + answer + "...\n\n")
+        remaining -= cost
+    return ''.join(reversed(entries))
+
 def generate_context_aware_prompt(query, user_profile, conversation_history=[]):
     """Create dramatically different prompts based on age and role combinations with conversation context"""
-    age_group = user_profile.get('age_group', 'adult')
-    role = user_profile.get('role', 'general')
-    industry = user_profile.get('industry', 'general')
+    routing = resolve_policy(user_profile)
     
-    # Add conversation history if available
+    # Add as much conversation history as the profile's input budget allows
     context = ""
     if conversation_history:
-        context = "Previous conversation:\n"
-        for turn in conversation_history[-3:]:  # Last 3 turns
-            context += f"Q: {turn['query']}\nA: {turn['response'][:200]}...\n\n"
-        context += "Current question:\n"
-    
-    # Create role-specific prompts that are completely different
-    if role == 'student' and age_group == 'teen':
-        prompt = f"{context}A 13-year-old student is asking: {query}\n\n"
-        prompt += "Answer like you're explaining to a curious teenager. Use simple, clear language that a 8th grader can understand. Make it engaging and relatable to their world - school, friends, social media, games. Keep it educational but fun. Use 2-3 sentences maximum. Avoid baby talk but keep it age-appropriate."
-        
-    elif role == 'teacher' and age_group == 'adult':
-        prompt = f"{context}An experienced teacher is asking: {query}\n\n"
-        prompt += "Provide a comprehensive educational response with teaching strategies, curriculum connections, and pedagogical insights. Include how to explain this concept to different grade levels, classroom activities, and educational best practices. Be professional and detailed."
-        
-    elif role == 'patient' and industry == 'healthcare':
-        prompt = f"{context}A healthcare patient is asking: {query}\n\n"
-        prompt += "Explain in simple, reassuring terms that a worried patient can understand. Avoid complex medical jargon. Focus on general health information and encourage consulting healthcare providers for specific medical advice. Be empathetic and clear."
-        
-    elif role == 'provider' and industry == 'healthcare':
-        prompt = f"{context}A healthcare provider is asking: {query}\n\n"
-        prompt += "Provide detailed clinical information with appropriate medical terminology, evidence-based recommendations, and professional insights. Include relevant medical guidelines, diagnostic considerations, and treatment protocols as appropriate for healthcare professionals."
-        
-    else:
-        # Default adult response
-        prompt = f"{context}Answer this question professionally: {query}\n\n"
-        prompt += "Provide a clear, informative response appropriate for an adult audience. Be accurate, helpful, and comprehensive."
+        history = build_history_context(conversation_history, routing['history_tokens'])
+        if history:
+            context = "Previous conversation:\n" + history + "Current question:\n"
     
-    return prompt
+    return context + routing['template'].format(query=query)
+
+# Simple grammar corrections for common mistakes
+GRAMMAR_CORRECTIONS = {
+    'wat is': 'what is',
+    'wats': 'what is',
+    'whats': 'what is',
+    'whos': 'who is',
+    'hows': 'how is',
+    'wheres': 'where is',
+    'whens': 'when is',
+    'whys': 'why is',
+    'ur': 'your',
+    'u': 'you',
+    'r': 'are',
+    'n': 'and',
+    'b4': 'before',
+    'plz': 'please',
+    'pls': 'please',
+    'thx': 'thanks',
+    'ty': 'thank you'
+}
+
+def load_grammar_corrections():
+    """Built-in corrections extended/overridden by GRAMMAR_CORRECTIONS (JSON object)"""
+    corrections = dict(GRAMMAR_CORRECTIONS)
+    extra = os.environ.get('GRAMMAR_CORRECTIONS')
+    if extra:
+        corrections.update(json.loads(extra))
+    return corrections
+
+def compile_grammar_corrections(corrections):
+    """
+    Compile corrections into a single word-boundary regex built from a prefix
+    trie, so a query is rewritten in one pass. Matching is whole words only
+    (no 'ty' inside 'party') and replacements never chain.
+    Returns (pattern, corrections_by_mistake).
+    """
+    # Only apply word-level corrections, not single character replacements for math
+    rules = {mistake.lower(): correction for mistake, correction in corrections.items() if len(mistake) > 1}
+    if not rules:
+        return None, rules
+    return compile_trie_regex(rules), rules
+
+def apply_grammar_corrections(text, pattern, rules):
+    """Rewrite every matched word/phrase in one pass"""
+    if pattern is None:
+        return text
+    return pattern.sub(lambda match: rules[match.group()], text)
+
+# Compiled once per cold start
+grammar_pattern, grammar_rules = compile_grammar_corrections(load_grammar_corrections())
 
 def auto_correct_grammar(query):
     """Auto-correct grammar using Claude AI"""
@@ -199,34 +1665,8 @@ def auto_correct_grammar(query):
         # Skip correction for numbers-only queries
         if query.replace(' ', '').replace('+', '').replace('-', '').replace('*', '').replace('/', '').isdigit():
             return query
-            
-        # Simple grammar corrections for common mistakes
-        corrections = {
-            'wat is': 'what is',
-            'wats': 'what is',
-            'whats': 'what is', 
-            'whos': 'who is',
-            'hows': 'how is',
-            'wheres': 'where is',
-            'whens': 'when is',
-            'whys': 'why is',
-            'ur': 'your',
-            'u': 'you',
-            'r': 'are',
-            'n': 'and',
-            'b4': 'before',
-            'plz': 'please',
-            'pls': 'please',
-            'thx': 'thanks',
-            'ty': 'thank you'
-        }
         
-        corrected = query.lower()
-        
-        # Only apply word-level corrections, not single character replacements for math
-        for mistake, correction in corrections.items():
-            if len(mistake) > 1:  # Skip single character replacements
-                corrected = corrected.replace(mistake, correction)
+        corrected = apply_grammar_corrections(query.lower(), grammar_pattern, grammar_rules)
         
         # Capitalize first letter
         if corrected:
@@ -244,37 +1684,93 @@ def auto_correct_grammar(query):
         logger.error(f"Grammar correction error: {e}")
         return query  # Return original if correction fails
 
-def get_conversation_history(user_id, conversation_id):
-    """Get conversation history from DynamoDB"""
+def empty_conversation_state():
+    return {'turns': [], 'version': 0}
+
+def get_conversation_state(user_id, conversation_id, include_pending=True):
+    """
+    Load the conversation-state item with one strongly consistent read, so a
+    follow-up sent right after the previous answer always sees that turn.
+    Returns {'turns': [...], 'version': n}; version 0 means no item exists yet.
+    Conversations owned by another user are treated as empty. Turns this
+    container queued that the audit consumer has not written yet are included.
+    """
     try:
-        table = dynamodb.Table(os.environ['AUDIT_TABLE'])
-        response = table.query(
-            IndexName='conversation-index',  # You'd need to add this GSI
-            KeyConditionExpression='conversation_id = :cid',
-            ExpressionAttributeValues={':cid': conversation_id},
-            ScanIndexForward=True,
-            Limit=10
+        table = get_dynamodb().Table(os.environ['CONVERSATION_TABLE'])
+        item = table.get_item(Key={'conversation_id': conversation_id}, ConsistentRead=True).get('Item')
+        if item and item.get('user_id') != user_id:
+            logger.warning(f"Conversation {conversation_id} does not belong to {user_id}")
+            return empty_conversation_state()
+        state = (
+            {'turns': list(item.get('turns', [])), 'version': int(item.get('version', 0))}
+            if item else empty_conversation_state()
         )
-        return response.get('Items', [])
+        pending = pending_conversations.get(conversation_id) if include_pending else None
+        if pending and pending['user_id'] == user_id and pending['version'] > state['version']:
+            return {'turns': list(pending['turns']), 'version': pending['version']}
+        return state
     except Exception as e:
         logger.error(f"Error getting conversation history: {e}")
-        return []
+        return empty_conversation_state()
 
-def save_conversation_turn(user_id, conversation_id, query, response):
-    """Save conversation turn for follow-ups"""
+def conversation_turn(conversation):
+    """Turn as stored in the conversation ring"""
+    return {
+        'query': conversation['query'][:1000],
+        'response': conversation['response'][:CONVERSATION_RESPONSE_CHARS],
+        'timestamp': conversation['timestamp']
+    }
+
+def save_conversation_turn(user_id, conversation_id, query, response, state=None, timestamp=None):
+    """
+    Append a turn to the conversation-state item with one conditional update.
+    The ring keeps the last CONVERSATION_MAX_TURNS turns; the condition on
+    `version` (and owner) makes concurrent turns on the same conversation
+    retry against the fresh state instead of overwriting each other. A turn
+    that is already stored (a redelivered queue event) is not appended again.
+    Returns True once the turn is stored.
+    """
+    state = state or empty_conversation_state()
+    turn = conversation_turn({
+        'query': query, 'response': response, 'timestamp': timestamp or datetime.now().isoformat()
+    })
     try:
-        table = dynamodb.Table(os.environ['AUDIT_TABLE'])
-        table.put_item(Item={
-            'interaction_id': f"{user_id}-{int(datetime.now().timestamp())}",
-            'conversation_id': conversation_id,
-            'user_id': user_id,
-            'timestamp': datetime.now().isoformat(),
-            'query': query[:1000],
-            'response': response[:2000],  # Store response for context
-            'ttl': int(datetime.now().timestamp()) + (24 * 60 * 60)  # 24 hour TTL
-        })
+        table = get_dynamodb().Table(os.environ['CONVERSATION_TABLE'])
+        for attempt in range(CONVERSATION_SAVE_ATTEMPTS):
+            if state['version']:
+                condition = '#version = :expected AND user_id = :uid'
+                values = {':expected': state['version']}
+            else:
+                condition = 'attribute_not_exists(conversation_id)'
+                values = {}
+            values.update({
+                ':turns': (state['turns'] + [turn])[-CONVERSATION_MAX_TURNS:],
+                ':next': state['version'] + 1,
+                ':uid': user_id,
+                ':updated': turn['timestamp'],
+                ':ttl': int(datetime.now().timestamp()) + CONVERSATION_TTL_SECONDS
+            })
+            try:
+                table.update_item(
+                    Key={'conversation_id': conversation_id},
+                    UpdateExpression='SET turns = :turns, #version = :next, user_id = :uid, '
+                                     'updated_at = :updated, #ttl = :ttl',
+                    ConditionExpression=condition,
+                    ExpressionAttributeNames={'#version': 'version', '#ttl': 'ttl'},
+                    ExpressionAttributeValues=values
+                )
+                return True
+            except ClientError as e:
+                if e.response.get('Error', {}).get('Code') != 'ConditionalCheckFailedException':
+                    raise
+                # Another turn landed first (or the id belongs to someone else): reload and retry
+                state = get_conversation_state(user_id, conversation_id, include_pending=False)
+                if turn in state['turns']:
+                    return True
+        logger.error(f"Error saving conversation: {conversation_id} kept changing during {CONVERSATION_SAVE_ATTEMPTS} attempts")
     except Exception as e:
         logger.error(f"Error saving conversation: {e}")
+    return False
 
 def select_guardrail_configuration(user_profile):
     """
@@ -282,118 +1778,437 @@ def select_guardrail_configuration(user_profile):
     Guardrails are ALWAYS applied - never bypassed
     Context determines WHICH guardrail, not WHETHER to apply one
     """
-    age_group = user_profile.get('age_group', 'adult')
-    role = user_profile.get('role', 'general')
-    industry = user_profile.get('industry', 'general')
-    
-    # CHILD PROTECTION (Maximum Security)
-    if age_group == 'child':
-        return {
-            'guardrail_id': os.environ.get('CHILD_GUARDRAIL_ID'),
-            'guardrail_version': '1',
-            'protection_level': 'maximum',
-            'compliance': 'COPPA'
-        }
-    
-    # TEEN EDUCATIONAL (Balanced Protection)
-    elif age_group == 'teen':
-        return {
-            'guardrail_id': os.environ.get('TEEN_GUARDRAIL_ID'),
-            'guardrail_version': '1',
-            'protection_level': 'balanced',
-            'context': 'educational'
-        }
-    
-    # HEALTHCARE PROFESSIONAL (HIPAA Compliance)
-    elif industry == 'healthcare' and role == 'provider':
-        return {
-            'guardrail_id': os.environ.get('HEALTHCARE_PROFESSIONAL_GUARDRAIL_ID'),
-            'guardrail_version': '1',
-            'protection_level': 'clinical',
-            'compliance': 'HIPAA'
-        }
+    return resolve_policy(user_profile)['guardrail_config']
+
+def prescreen_query(query, user_profile):
+    """
+    Match the query against the selected guardrail's denied terms before any
+    model call. Returns a blocked response shaped like call_bedrock_with_guardrails'
+    result on a match, otherwise None. This only adds protection: queries that
+    pass are still filtered by the Bedrock guardrail as usual.
+    """
+    routing = resolve_policy(user_profile)
+    prescreen = routing['prescreen']
+    if prescreen is None:
+        return None
+    match = prescreen['pattern'].search(query)
+    if match is None:
+        return None
+    logger.info(f"Pre-screen blocked query for {routing['guardrail_config'].get('protection_level')} guardrail")
+    return {
+        'content': prescreen['message'],
+        'guardrail_config': routing['guardrail_config'],
+        'guardrail_action': 'INTERVENED',
+        'prescreen_term': match.group().lower()
+    }
+
+def build_guardrail_request(routing, prompt):
+    """
+    Selected guardrail (falling back to the default one, never none) and the
+    request body for a routed model call. Returns (guardrail_id,
+    guardrail_version, body).
+    """
+    guardrail_config = routing['guardrail_config']
+    guardrail_id = guardrail_config['guardrail_id']
+    guardrail_version = guardrail_config['guardrail_version']
     
-    # HEALTHCARE PATIENT (Medical Advice Blocking)
-    elif industry == 'healthcare' and role == 'patient':
-        return {
-            'guardrail_id': os.environ.get('HEALTHCARE_PATIENT_GUARDRAIL_ID'),
-            'guardrail_version': '1',
-            'protection_level': 'medical_safety',
-            'compliance': 'Patient_Safety'
-        }
+    if not guardrail_id:
+        logger.error("No guardrail configuration found - this should never happen")
+        # Fallback to default guardrail - never bypass guardrails
+        guardrail_id = os.environ.get('DEFAULT_GUARDRAIL_ID')
     
-    # ADULT GENERAL (Standard Protection)
-    else:
-        return {
-            'guardrail_id': os.environ.get('ADULT_GENERAL_GUARDRAIL_ID'),
-            'guardrail_version': '1',
-            'protection_level': 'standard',
-            'context': 'general'
-        }
+    request_body = {
+        "anthropic_version": "bedrock-2023-05-31",
+        "max_tokens": routing['max_tokens'],
+        "messages": [{"role": "user", "content": prompt}]
+    }
+    return guardrail_id, guardrail_version, json.dumps(request_body)
 
 def call_bedrock_with_guardrails(prompt, user_profile):
     """Call Bedrock with dynamically selected guardrails based on user context"""
+    # One counter set per hedge leg: the legs run on different threads
+    primary_stats, hedge_stats = new_call_stats(), new_call_stats()
     try:
         # CORE INNOVATION: Dynamic guardrail selection
-        guardrail_config = select_guardrail_configuration(user_profile)
+        routing = resolve_policy(user_profile)
+        guardrail_config = routing['guardrail_config']
+        guardrail_id, guardrail_version, body = build_guardrail_request(routing, prompt)
         
-        guardrail_id = guardrail_config['guardrail_id']
-        guardrail_version = guardrail_config['guardrail_version']
+        # ALWAYS call with guardrails - guardrails are never bypassed (fallback models included)
+        def primary():
+            response, model_id = invoke_routed_model(
+                'invoke_model',
+                routing,
+                call_stats=primary_stats,
+                body=body,
+                contentType="application/json",
+                accept="application/json",
+                guardrailIdentifier=guardrail_id,
+                guardrailVersion=guardrail_version
+            )
+            return json.loads(response['body'].read()), model_id
         
-        if not guardrail_id:
-            logger.error("No guardrail configuration found - this should never happen")
-            # Fallback to default guardrail - never bypass guardrails
-            guardrail_id = os.environ.get('DEFAULT_GUARDRAIL_ID')
-            
-        request_body = {
-            "anthropic_version": "bedrock-2023-05-31",
-            "max_tokens": 500,
-            "messages": [{"role": "user", "content": prompt}]
-        }
+        # The hedge leg carries the same guardrail (its copy in HEDGE_REGION)
+        def hedge():
+            model_id = routing['model_id']
+            if not model_id.startswith(HEDGE_PROFILE_PREFIX):
+                model_id = HEDGE_PROFILE_PREFIX + model_id
+            response = invoke_bedrock(
+                'invoke_model',
+                client=get_hedge_bedrock(),
+                breaker_key=f"{HEDGE_REGION}/{model_id}" if HEDGE_REGION else model_id,
+                call_stats=hedge_stats,
+                modelId=model_id,
+                body=body,
+                contentType="application/json",
+                accept="application/json",
+                guardrailIdentifier=routing['hedge_guardrail_id'],
+                guardrailVersion=guardrail_version
+            )
+            return json.loads(response['body'].read()), model_id
         
-        # ALWAYS call with guardrails - guardrails are never bypassed
-        response = bedrock.invoke_model(
-            modelId="anthropic.claude-3-sonnet-20240229-v1:0",
-            body=json.dumps(request_body),
-            contentType="application/json",
-            accept="application/json",
-            guardrailIdentifier=guardrail_id,
-            guardrailVersion=guardrail_version
+        (response_body, model_id), leg, hedged = request_hedger.call(
+            (routing['model_id'], routing['max_tokens']), primary, hedge if routing['hedge_guardrail_id'] else None
         )
         
-        response_body = json.loads(response['body'].read())
-        
         # Return both response and guardrail metadata
         return {
             'content': response_body['content'][0]['text'],
-            'guardrail_config': guardrail_config
+            'guardrail_config': guardrail_config,
+            'guardrail_action': response_body.get('amazon-bedrock-guardrailAction', 'NONE'),
+            'model_id': model_id,
+            'model_fallback': leg == 'primary' and model_id != routing['model_id'],
+            'hedged': hedged,
+            'hedge_leg': leg,
+            'call_stats': merge_call_stats(primary_stats, hedge_stats)
+        }
+        
+    except CircuitOpenError:
+        # Fail fast while Bedrock is throttling instead of waiting out retries
+        return {
+            'content': DEGRADED_MESSAGE,
+            'guardrail_config': {'error': 'Bedrock temporarily unavailable'},
+            'degraded': True,
+            'call_stats': merge_call_stats(primary_stats, hedge_stats)
         }
         
     except Exception as e:
         logger.error(f"Bedrock error: {e}")
         return {
             'content': "I apologize, but I'm unable to process your request at this time.",
-            'guardrail_config': {'error': str(e)}
+            'guardrail_config': {'error': str(e)},
+            'call_stats': merge_call_stats(primary_stats, hedge_stats)
         }
 
 
 
-def log_interaction(user_id, query, response, user_profile):
-    """Log interaction for audit"""
-    try:
-        table = dynamodb.Table(os.environ['AUDIT_TABLE'])
-        
-        table.put_item(Item={
-            'interaction_id': f"{user_id}-{int(datetime.now().timestamp())}",
-            'user_id': user_id,
-            'timestamp': datetime.now().isoformat(),
-            'query': query[:1000],  # Limit length
-            'response_length': len(response),
-            'age_group': user_profile.get('age_group', 'unknown'),
-            'role': user_profile.get('role', 'unknown')
+def normalize_query(query):
+    """Normalize a corrected query for cache lookups"""
+    normalized = re.sub(r'\s+', ' ', query.lower()).strip()
+    return normalized.rstrip('?!. ')
+
+def response_cache_key(query, user_profile, guardrail_config):
+    """
+    Cache key scoped to everything that shapes the answer: the normalized query,
+    the prompt template, model and output budget, and the guardrail id/version.
+    Profiles that map to a different guardrail (e.g. child vs adult) can never
+    share an entry.
+    """
+    routing = resolve_policy(user_profile)
+    key_parts = [
+        normalize_query(query),
+        routing['template_name'],
+        routing['model_id'],
+        str(routing['max_tokens']),
+        user_profile.get('age_group', 'adult'),
+        guardrail_config.get('guardrail_id') or '',
+        guardrail_config.get('guardrail_version') or ''
+    ]
+    return hashlib.sha256('\x1f'.join(key_parts).encode('utf-8')).hexdigest()
+
+def record_response_cache(outcome):
+    with response_cache_lock:
+        response_cache_stats[outcome] += 1
+
+def get_response_cache_stats():
+    """Response cache hit/miss/bypass counters and hit rate"""
+    with response_cache_lock:
+        stats = dict(response_cache_stats)
+    lookups = stats['hits'] + stats['misses']
+    stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+    return stats
+
+def call_bedrock_cached(query, prompt, user_profile, conversation_history, rate_limited=True):
+    """
+    call_bedrock_with_guardrails behind the guardrail-scoped response cache.
+    Follow-ups (with conversation history) always bypass the cache, and failed
+    model calls are never cached. Only actual model calls are rate limited
+    (batch items are charged up front, rate_limited=False); raises
+    RateLimitExceeded.
+    """
+    if response_cache is None or conversation_history:
+        record_response_cache('bypasses')
+        if rate_limited:
+            rate_limiter.check(user_profile.get('user_id'), user_profile)
+        return call_bedrock_with_guardrails(prompt, user_profile)
+    
+    guardrail_config = select_guardrail_configuration(user_profile)
+    key = response_cache_key(query, user_profile, guardrail_config)
+    
+    cached = response_cache.get(key)
+    if cached is not None:
+        record_response_cache('hits')
+        return {
+            'content': cached['content'],
+            'guardrail_config': guardrail_config,
+            'guardrail_action': cached.get('guardrail_action', 'NONE'),
+            'model_id': cached.get('model_id'),
+            'cache_hit': True
+        }
+    
+    record_response_cache('misses')
+    if rate_limited:
+        rate_limiter.check(user_profile.get('user_id'), user_profile)
+    bedrock_response = call_bedrock_with_guardrails(prompt, user_profile)
+    bedrock_response['cache_hit'] = False
+    # Answers from a fallback model are not cached under the primary model's key
+    if 'error' not in bedrock_response['guardrail_config'] and not bedrock_response['model_fallback']:
+        response_cache.put(key, {
+            'content': bedrock_response['content'],
+            'guardrail_action': bedrock_response.get('guardrail_action', 'NONE'),
+            'model_id': bedrock_response['model_id']
         })
+    return bedrock_response
+
+def build_audit_item(interaction_id, user_id, query, response, user_profile, prescreen_term=None):
+    """Audit record for one interaction"""
+    item = {
+        'interaction_id': interaction_id,
+        'user_id': user_id,
+        'timestamp': datetime.now().isoformat(),
+        'query': query[:1000],  # Limit length
+        'response_length': len(response),
+        'age_group': user_profile.get('age_group', 'unknown'),
+        'role': user_profile.get('role', 'unknown')
+    }
+    # Record short-circuits by the local pre-screen (Bedrock was never called)
+    if prescreen_term:
+        item['prescreen_blocked'] = True
+        item['prescreen_term'] = prescreen_term
+    return item
+
+def new_interaction_id(user_id):
+    """Audit key: millisecond timestamp plus a random suffix, so concurrent requests never share a row"""
+    return f"{user_id}-{int(time.time() * 1000)}-{uuid.uuid4().hex[:8]}"
+
+def new_conversation_id(user_id):
+    """Conversation-state key, unique like new_interaction_id: two conversations started together never share a ring"""
+    return f"{user_id}-{int(time.time() * 1000)}-{uuid.uuid4().hex[:8]}"
+
+# Turn persistence. AUDIT_DELIVERY=sync writes the audit item and the conversation turn
+# before responding (for deployments that need them durable first); queue hands one
+# merged event per turn to the SQS FIFO queue AUDIT_QUEUE_URL, drained by
+# audit_consumer_handler; local is an in-process stand-in for tests and benchmarks.
+AUDIT_DELIVERY = os.environ.get('AUDIT_DELIVERY', 'sync')
+AUDIT_BATCH_ATTEMPTS = int(os.environ.get('AUDIT_BATCH_ATTEMPTS', '5'))
+
+def record_turn(user_id, conversation_id, query, response, user_profile, conversation_state, prescreen_term=None):
+    """Persist one answered turn: its audit item and the conversation turn, as a single event"""
+    audit = build_audit_item(new_interaction_id(user_id), user_id, query, response, user_profile, prescreen_term)
+    publish_turn_events([{
+        'audit': audit,
+        'conversation': {
+            'user_id': user_id,
+            'conversation_id': conversation_id,
+            'query': query[:1000],
+            'response': response[:CONVERSATION_RESPONSE_CHARS],
+            'timestamp': audit['timestamp'],
+            # State the turn was answered from: the consumer's conditional update expects this version
+            'turns': conversation_state['turns'],
+            'version': conversation_state['version']
+        }
+    }])
+
+def publish_turn_events(events):
+    """
+    Hand turn events to the configured delivery. If the queue is unreachable
+    the events are written synchronously instead of being dropped.
+    """
+    if audit_queue is None:
+        process_turn_events(events)
+        return
+    try:
+        audit_queue.send(events)
     except Exception as e:
-        logger.error(f"Audit logging error: {e}")
+        logger.error(f"Audit queue error, writing synchronously: {e}")
+        process_turn_events(events)
+        return
+    # The consumer writes the conversation later; this container's next follow-up
+    # reads the projected state instead of missing the turn
+    for event in events:
+        conversation = event['conversation']
+        if conversation:
+            pending_conversations.put(conversation['conversation_id'], {
+                'user_id': conversation['user_id'],
+                'turns': (conversation['turns'] + [conversation_turn(conversation)])[-CONVERSATION_MAX_TURNS:],
+                'version': conversation['version'] + 1
+            })
+
+def turn_event_group(event):
+    """FIFO message group of a turn event: its conversation, or the user for audit-only events"""
+    return (event.get('conversation') or {}).get('conversation_id') or event['audit']['user_id']
+
+def process_turn_events(events):
+    """
+    Write a batch of turn events: all audit items with BatchWriteItem (retrying
+    unprocessed items), then each conversation turn, in order, with its
+    conditional update. A group stops at its first failure, so a redelivered
+    turn is never appended after a later one; the rest of that group is
+    skipped (their audit items are idempotent puts, rewritten on redelivery).
+    Returns the indexes of events that could not be fully written.
+    """
+    audit_failed = set(write_audit_items([event['audit'] for event in events]))
+    failed = []
+    failed_groups = set()
+    for index, event in enumerate(events):
+        group = turn_event_group(event)
+        if group in failed_groups or index in audit_failed:
+            failed_groups.add(group)
+            failed.append(index)
+            continue
+        conversation = event.get('conversation')
+        if conversation and not save_conversation_turn(
+            conversation['user_id'], conversation['conversation_id'], conversation['query'], conversation['response'],
+            {'turns': conversation['turns'], 'version': conversation['version']}, timestamp=conversation['timestamp']
+        ):
+            failed_groups.add(group)
+            failed.append(index)
+    return failed
+
+def write_audit_items(items):
+    """
+    BatchWriteItem in chunks of 25, retrying UnprocessedItems with exponential
+    backoff. Returns the indexes of items still unwritten after AUDIT_BATCH_ATTEMPTS.
+    """
+    table_name = os.environ['AUDIT_TABLE']
+    failed = []
+    for start in range(0, len(items), 25):
+        pending = {item['interaction_id']: start + offset for offset, item in enumerate(items[start:start + 25])}
+        requests = [{'PutRequest': {'Item': item}} for item in items[start:start + 25]]
+        try:
+            for attempt in range(AUDIT_BATCH_ATTEMPTS):
+                if attempt:
+                    time.sleep(min(1.0, 0.05 * 2 ** attempt))
+                result = get_dynamodb().batch_write_item(RequestItems={table_name: requests})
+                requests = result.get('UnprocessedItems', {}).get(table_name, [])
+                if not requests:
+                    break
+        except Exception as e:
+            logger.error(f"Audit batch write error: {e}")
+        failed.extend(pending[request['PutRequest']['Item']['interaction_id']] for request in requests)
+    if failed:
+        logger.error(f"Audit batch write left {len(failed)} items unprocessed")
+    return failed
+
+class LocalAuditQueue:
+    """
+    In-process stand-in for the audit queue: a worker thread drains events in
+    batches of up to 25 through process_turn_events. Not durable; for tests
+    and benchmarks (flush() waits until everything queued has been written).
+    """
+
+    def __init__(self, linger_seconds=0.02):
+        self.linger_seconds = linger_seconds
+        self.queue = queue.Queue()
+        self.worker = threading.Thread(target=self.drain, name='audit-consumer', daemon=True)
+        self.worker.start()
+
+    def send(self, events):
+        for event in events:
+            self.queue.put(event)
+
+    def drain(self):
+        while True:
+            batch = [self.queue.get()]
+            deadline = time.monotonic() + self.linger_seconds
+            while len(batch) < 25:
+                try:
+                    batch.append(self.queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            try:
+                process_turn_events(batch)
+            except Exception as e:
+                logger.error(f"Local audit consumer error: {e}")
+            for _ in batch:
+                self.queue.task_done()
+
+    def flush(self):
+        self.queue.join()
+
+class SqsAuditQueue:
+    """
+    Producer for the SQS FIFO audit queue. Turns of one conversation share a
+    message group so the consumer appends them in order; the interaction id
+    deduplicates client-side resends.
+    """
+
+    def __init__(self, queue_url):
+        self.queue_url = queue_url
+        self.client = None
+
+    def get_client(self):
+        if self.client is None:
+            with clients_lock:
+                if self.client is None:
+                    self.client = boto3.client('sqs', config=client_config('SQS', 10, 1, 3, 3))
+        return self.client
+
+    def send(self, events):
+        for start in range(0, len(events), 10):
+            chunk = events[start:start + 10]
+            result = self.get_client().send_message_batch(
+                QueueUrl=self.queue_url,
+                Entries=[
+                    {
+                        'Id': str(index),
+                        'MessageBody': json.dumps(event, default=str),
+                        'MessageGroupId': turn_event_group(event),
+                        'MessageDeduplicationId': event['audit']['interaction_id']
+                    }
+                    for index, event in enumerate(chunk)
+                ]
+            )
+            if result.get('Failed'):
+                # Written directly so no turn is lost (duplicates of the audit item are idempotent)
+                process_turn_events([chunk[int(failure['Id'])] for failure in result['Failed']])
+
+def create_audit_queue():
+    if AUDIT_DELIVERY == 'queue':
+        if not os.environ.get('AUDIT_QUEUE_URL'):
+            raise ValueError("AUDIT_DELIVERY=queue requires AUDIT_QUEUE_URL")
+        return SqsAuditQueue(os.environ['AUDIT_QUEUE_URL'])
+    if AUDIT_DELIVERY == 'local':
+        return LocalAuditQueue()
+    if AUDIT_DELIVERY != 'sync':
+        raise ValueError(f"Unknown AUDIT_DELIVERY {AUDIT_DELIVERY!r}")
+    return None
+
+audit_queue = create_audit_queue()
+
+def audit_consumer_handler(event, context):
+    """
+    SQS consumer for the audit queue (separate function, same package).
+    Records that failed, and the records after them in the same message group
+    (never attempted, to keep FIFO order), are reported as batch item
+    failures so only those are redelivered.
+    """
+    records = event.get('Records', [])
+    failed = process_turn_events([json.loads(record['body']) for record in records])
+    failures = [{'itemIdentifier': records[index]['messageId']} for index in failed]
+    if failures:
+        logger.error(f"Audit consumer: {len(failures)} of {len(records)} records will be retried")
+    return {'batchItemFailures': failures}
 
 def cors_response(status_code, body):
     """Return response with CORS headers"""
@@ -402,8 +2217,15 @@ def cors_response(status_code, body):
         'headers': {
             'Content-Type': 'application/json',
             'Access-Control-Allow-Origin': '*',
-            'Access-Control-Allow-Headers': 'Content-Type,Authorization',
+            'Access-Control-Allow-Headers': 'Content-Type,Authorization,Idempotency-Key',
             'Access-Control-Allow-Methods': 'POST,OPTIONS'
         },
         'body': json.dumps(body) if isinstance(body, dict) else body
-    }
\ No newline at end of file
+    }
+
+def rate_limited_response(error):
+    """429 with Retry-After (exposed to browsers through CORS)"""
+    response = cors_response(429, {'error': 'Too many requests', 'scope': error.scope, 'retry_after': error.retry_after})
+    response['headers']['Retry-After'] = str(error.retry_after)
+    response['headers']['Access-Control-Expose-Headers'] = 'Retry-After'
+    return response
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Cold-start budget check for the Lambda package.
+
+Measures, each in a fresh interpreter (median of --runs):
+  - import time of app.py (the init phase the runtime bills on every cold start)
+  - first-use client creation (get_dynamodb + get_bedrock, paid by the first request)
+and the deployment package size (app.zip and the unzipped package/ directory).
+
+--build runs build_package.sh, the same build deploy.sh ships, so the package
+measured is the one Terraform zips. --max-import-ms / --max-package-mb turn it
+into a gate: the script exits non-zero when a budget is exceeded, so
+regressions fail before they reach p99.
+
+Usage:
+    python3 benchmarks/coldstart_bench.py --runs 7
+    python3 benchmarks/coldstart_bench.py --build --max-import-ms 400 --max-package-mb 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+LAMBDA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# Enough configuration for app.py to import; nothing here talks to AWS
+COLDSTART_ENV = {
+    'AWS_DEFAULT_REGION': 'us-east-1',
+    'AWS_ACCESS_KEY_ID': 'coldstart',
+    'AWS_SECRET_ACCESS_KEY': 'coldstart',
+    'USER_TABLE': 'coldstart-users',
+    'AUDIT_TABLE': 'coldstart-audit',
+    'RESPONSE_CACHE_BACKEND': 'none',
+    'METRICS_ENABLED': 'false'
+}
+
+# Runs inside the child interpreter; prints one JSON line of timings in ms
+PROBE = """
+import json, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+app.get_dynamodb()
+app.get_bedrock()
+clients = time.perf_counter()
+print(json.dumps({'import_ms': (imported - start) * 1000, 'clients_ms': (clients - imported) * 1000}))
+"""
+
+def probe_once(source_dir, python):
+    env = dict(os.environ, **COLDSTART_ENV)
+    env['PYTHONPATH'] = source_dir
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    result = subprocess.run([python, '-c', PROBE], cwd=source_dir, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        sys.exit(f"Importing app from {source_dir} failed:\n{result.stderr}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def directory_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            total += os.path.getsize(os.path.join(root, name))
+    return total
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5, help='fresh interpreters per measurement')
+    parser.add_argument('--build', action='store_true', help='run build_package.sh (the deploy.sh build) first')
+    parser.add_argument('--source', choices=['package', 'source'], default=None,
+                        help='import from the built package/ (with its .pyc) or from lambda/ (default: package if built)')
+    parser.add_argument('--python', default=sys.executable, help='interpreter to measure with (match the Lambda runtime)')
+    parser.add_argument('--max-import-ms', type=float, help='fail if median import time exceeds this')
+    parser.add_argument('--max-package-mb', type=float, help='fail if app.zip exceeds this')
+    parser.add_argument('--json', help='also write the report as JSON to this path')
+    args = parser.parse_args()
+
+    if args.build:
+        subprocess.run(['bash', 'build_package.sh'], cwd=LAMBDA_DIR, check=True)
+
+    package_dir = os.path.join(LAMBDA_DIR, 'package')
+    source = args.source or ('package' if os.path.isdir(package_dir) else 'source')
+    source_dir = package_dir if source == 'package' else LAMBDA_DIR
+
+    # The first run may write bytecode caches when importing from source; it is not counted
+    probe_once(source_dir, args.python)
+    samples = [probe_once(source_dir, args.python) for _ in range(args.runs)]
+
+    zip_path = os.path.join(LAMBDA_DIR, 'app.zip')
+    report = {
+        'source': source,
+        'runs': args.runs,
+        'import_ms': statistics.median(s['import_ms'] for s in samples),
+        'clients_ms': statistics.median(s['clients_ms'] for s in samples),
+        'zip_bytes': os.path.getsize(zip_path) if os.path.exists(zip_path) else None,
+        'unzipped_bytes': directory_size(package_dir) if os.path.isdir(package_dir) else None
+    }
+
+    print(f"import app ({source}): {report['import_ms']:.1f} ms median of {args.runs}")
+    print(f"first-use clients:    {report['clients_ms']:.1f} ms")
+    if report['zip_bytes'] is not None:
+        print(f"app.zip:              {report['zip_bytes'] / 1e6:.2f} MB "
+              f"({report['unzipped_bytes'] / 1e6:.2f} MB unzipped)")
+    else:
+        print("app.zip:              not built (use --build)")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    failures = []
+    if args.max_import_ms is not None and report['import_ms'] > args.max_import_ms:
+        failures.append(f"import time {report['import_ms']:.1f} ms > {args.max_import_ms} ms")
+    if args.max_package_mb is not None and report['zip_bytes'] and report['zip_bytes'] / 1e6 > args.max_package_mb:
+        failures.append(f"package size {report['zip_bytes'] / 1e6:.2f} MB > {args.max_package_mb} MB")
+    if failures:
+        print("Cold-start budget exceeded: " + '; '.join(failures))
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for auto_correct_grammar's correction pass.
+Compares the legacy one-str.replace-per-rule loop with the compiled
+single-pass trie regex for growing rule counts on a max-length query.
+
+Usage: python3 benchmarks/grammar_bench.py [--rules 17,100,300,1000] [--hit-ratio 0.1] [--number 200]
+"""
+import argparse
+import os
+import random
+import string
+import sys
+import timeit
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import app  # noqa: E402
+
+MAX_QUERY_LENGTH = 1000
+
+def legacy_corrections(text, corrections):
+    """The previous implementation: one full-string replace per rule"""
+    for mistake, correction in corrections.items():
+        if len(mistake) > 1:
+            text = text.replace(mistake, correction)
+    return text
+
+def synthetic_rules(count, rng):
+    """Built-in rules padded with random slang-like words up to `count` rules"""
+    rules = dict(app.GRAMMAR_CORRECTIONS)
+    while len(rules) < count:
+        word = ''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(2, 7)))
+        rules.setdefault(word, word.upper())
+    return rules
+
+def synthetic_query(rules, rng, hit_ratio):
+    """A query of exactly MAX_QUERY_LENGTH characters where roughly hit_ratio of the words need correcting"""
+    mistakes = list(rules)
+    ordinary = ['photosynthesis', 'explain', 'the', 'party', 'history', 'of', 'science', 'pretty', 'ours']
+    words = []
+    while len(' '.join(words)) < MAX_QUERY_LENGTH:
+        words.append(rng.choice(mistakes if rng.random() < hit_ratio else ordinary))
+    return ' '.join(words)[:MAX_QUERY_LENGTH]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rules', default='17,100,300,1000', help='comma-separated rule counts')
+    parser.add_argument('--hit-ratio', type=float, default=0.1, help='fraction of query words that are corrections')
+    parser.add_argument('--number', type=int, default=200, help='iterations per measurement')
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    print(f"{'rules':>6} {'legacy us':>11} {'compiled us':>12} {'speedup':>8}")
+    for count in (int(c) for c in args.rules.split(',')):
+        rules = synthetic_rules(count, rng)
+        query = synthetic_query(rules, rng, args.hit_ratio)
+        pattern, compiled_rules = app.compile_grammar_corrections(rules)
+
+        legacy = min(timeit.repeat(lambda: legacy_corrections(query, rules), number=args.number, repeat=5))
+        compiled = min(timeit.repeat(lambda: app.apply_grammar_corrections(query, pattern, compiled_rules), number=args.number, repeat=5))
+
+        legacy_us = legacy / args.number * 1e6
+        compiled_us = compiled / args.number * 1e6
+        print(f"{len(rules):>6} {legacy_us:>11.1f} {compiled_us:>12.1f} {legacy_us / compiled_us:>7.1f}x")
+
+if __name__ == '__main__':
+    main()
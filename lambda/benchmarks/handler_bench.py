@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark for the full lambda_handler pipeline.
+
+Replays synthetic API Gateway events for every guardrail branch (child, teen,
+healthcare provider, healthcare patient, adult/senior general) against local
+DynamoDB and Bedrock stand-ins, and reports p50/p95/p99 latency per stage plus
+overall throughput. This is the baseline every performance change is judged
+against - run it before and after a change with the same arguments.
+
+Usage:
+    python3 benchmarks/handler_bench.py --requests 300 --concurrency 4
+    python3 benchmarks/handler_bench.py --bedrock-ms 800 --throttle-rate 0.05 --intervention-rate 0.1 --json out.json
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+BENCH_ENV = {
+    'AWS_DEFAULT_REGION': 'us-east-1',
+    'USER_TABLE': 'bench-users',
+    'AUDIT_TABLE': 'bench-audit',
+    'CONVERSATION_TABLE': 'bench-conversations',
+    'CHILD_GUARDRAIL_ID': 'bench-child-guardrail',
+    'TEEN_GUARDRAIL_ID': 'bench-teen-guardrail',
+    'HEALTHCARE_PROFESSIONAL_GUARDRAIL_ID': 'bench-healthcare-professional-guardrail',
+    'HEALTHCARE_PATIENT_GUARDRAIL_ID': 'bench-healthcare-patient-guardrail',
+    'ADULT_GENERAL_GUARDRAIL_ID': 'bench-adult-general-guardrail',
+    'DEFAULT_GUARDRAIL_ID': 'bench-adult-general-guardrail',
+    'RESPONSE_CACHE_BACKEND': 'none',
+    # Replays far exceed per-user limits; set RATE_LIMIT_ENABLED=true to measure throttling
+    'RATE_LIMIT_ENABLED': 'false',
+    # The harness times stages itself; set METRICS_ENABLED=true to include EMF overhead
+    'METRICS_ENABLED': 'false'
+}
+for name, value in BENCH_ENV.items():
+    os.environ.setdefault(name, value)
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, '..'))
+sys.path.insert(0, BENCH_DIR)
+
+import app  # noqa: E402
+from stubs import DEMO_PROFILES, TABLE_KEYS, StubBedrock, StubDynamoDB  # noqa: E402
+
+# Pipeline functions timed as stages (looked up on the app module at call time)
+STAGES = [
+    'get_user_profile',
+    'get_conversation_state',
+    'auto_correct_grammar',
+    'generate_context_aware_prompt',
+    'call_bedrock_with_guardrails',
+    'record_turn',
+    'process_turn_events'
+]
+
+QUERIES = [
+    'whats photosynthesis',
+    'How do I solve quadratic equations?',
+    'explain the water cycle plz',
+    'What is DNA?',
+    'wat is the best way to study for exams',
+    'What medication should I take for chest pain?',
+    'hows the immune system work',
+    'Who is the Prime Minister of Mars?'
+]
+
+FOLLOW_UPS = ['can u explain that more simply', 'give me an example', 'why is that important']
+
+class StageTimer:
+    """Collects wall-clock durations (ms) per stage from any thread"""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.lock = threading.Lock()
+
+    def record(self, stage, elapsed_ms):
+        with self.lock:
+            self.samples[stage].append(elapsed_ms)
+
+    def wrap(self, stage, func):
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.record(stage, (time.perf_counter() - start) * 1000)
+        return timed
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(pct / 100.0 * len(sorted_values))))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+def summarize(samples):
+    values = sorted(samples)
+    return {
+        'count': len(values),
+        'mean_ms': sum(values) / len(values) if values else 0.0,
+        'p50_ms': percentile(values, 50),
+        'p95_ms': percentile(values, 95),
+        'p99_ms': percentile(values, 99),
+        'max_ms': values[-1] if values else 0.0
+    }
+
+def api_gateway_event(user_id, body):
+    """Minimal API Gateway proxy event as delivered after the Cognito authorizer"""
+    return {
+        'httpMethod': 'POST',
+        'path': '/ask',
+        'headers': {'Content-Type': 'application/json'},
+        'requestContext': {'authorizer': {'claims': {'cognito:username': user_id, 'sub': user_id}}},
+        'body': json.dumps(body)
+    }
+
+def install_stubs(args):
+    table_names = {env: os.environ.get(env) for env in TABLE_KEYS}
+    app.dynamodb = StubDynamoDB(table_names, latency_ms=args.dynamodb_ms, jitter_ms=args.dynamodb_ms / 3)
+    app.bedrock = StubBedrock(
+        latency_ms=args.bedrock_ms,
+        jitter_ms=args.bedrock_ms / 4,
+        throttle_rate=args.throttle_rate,
+        intervention_rate=args.intervention_rate,
+        throttle_models=args.throttle_models.split(',') if args.throttle_models else None,
+        slow_rate=args.slow_rate
+    )
+    return app.bedrock
+
+def install_timers(timer):
+    for stage in STAGES:
+        if hasattr(app, stage):
+            setattr(app, stage, timer.wrap(stage, getattr(app, stage)))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=200, help='total requests to replay')
+    parser.add_argument('--concurrency', type=int, default=1, help='concurrent closed-loop workers')
+    parser.add_argument('--dynamodb-ms', type=float, default=8.0, help='mean DynamoDB call latency')
+    parser.add_argument('--bedrock-ms', type=float, default=1200.0, help='mean Bedrock generation latency')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='probability a Bedrock call is throttled')
+    parser.add_argument('--throttle-models', help='comma-separated model id substrings that throttle (default: all)')
+    parser.add_argument('--slow-rate', type=float, default=0.0, help='probability a Bedrock call takes 5x longer')
+    parser.add_argument('--intervention-rate', type=float, default=0.0, help='probability the guardrail intervenes')
+    parser.add_argument('--followup-rate', type=float, default=0.3, help='fraction of requests that are follow-ups')
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--json', help='also write the report as JSON to this path')
+    parser.add_argument('--verbose', action='store_true', help='keep the handler logs (errors for simulated throttling etc.)')
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.CRITICAL)
+
+    random.seed(args.seed)
+    bedrock_stub = install_stubs(args)
+    timer = StageTimer()
+    install_timers(timer)
+
+    conversations = {}
+    conversations_lock = threading.Lock()
+    status_counts = defaultdict(int)
+    status_lock = threading.Lock()
+
+    def one_request(index):
+        profile = DEMO_PROFILES[index % len(DEMO_PROFILES)]
+        user_id = profile['user_id']
+        rng = random.Random(args.seed * 100003 + index)
+        with conversations_lock:
+            conversation_id = conversations.get(user_id)
+        body = {'query': rng.choice(QUERIES)}
+        if conversation_id and rng.random() < args.followup_rate:
+            body = {'query': rng.choice(FOLLOW_UPS), 'conversation_id': conversation_id}
+
+        start = time.perf_counter()
+        response = app.lambda_handler(api_gateway_event(user_id, body), None)
+        timer.record('handler', (time.perf_counter() - start) * 1000)
+
+        with status_lock:
+            status_counts[response['statusCode']] += 1
+        if response['statusCode'] == 200:
+            with conversations_lock:
+                conversations[user_id] = json.loads(response['body']).get('conversation_id')
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(one_request, range(args.requests)))
+    elapsed = time.perf_counter() - started
+    # AUDIT_DELIVERY=local: let the in-process consumer finish so its writes are in the report
+    if isinstance(app.audit_queue, app.LocalAuditQueue):
+        app.audit_queue.flush()
+
+    report = {
+        'config': vars(args),
+        'elapsed_s': elapsed,
+        'throughput_rps': args.requests / elapsed if elapsed else 0.0,
+        'status_counts': dict(status_counts),
+        'bedrock': {
+            'calls': bedrock_stub.calls,
+            'calls_by_model': dict(bedrock_stub.calls_by_model),
+            'throttled': bedrock_stub.throttled,
+            'interventions': bedrock_stub.interventions
+        },
+        'hedging': app.get_hedge_stats(),
+        'stages': {stage: summarize(samples) for stage, samples in timer.samples.items()}
+    }
+
+    print(f"requests={args.requests} concurrency={args.concurrency} elapsed={elapsed:.2f}s "
+          f"throughput={report['throughput_rps']:.1f} req/s statuses={dict(status_counts)}")
+    print(f"bedrock calls={bedrock_stub.calls} throttled={bedrock_stub.throttled} "
+          f"interventions={bedrock_stub.interventions} by model={dict(bedrock_stub.calls_by_model)}")
+    if report['hedging']['enabled']:
+        print(f"hedged={report['hedging']['hedged']} hedge wins={report['hedging']['hedge_wins']} "
+              f"budget exhausted={report['hedging']['budget_exhausted']}")
+    print(f"{'stage':<32} {'count':>6} {'mean':>9} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}")
+    for stage in ['handler'] + STAGES:
+        if stage not in report['stages']:
+            continue
+        stats = report['stages'][stage]
+        print(f"{stage:<32} {stats['count']:>6} {stats['mean_ms']:>9.2f} {stats['p50_ms']:>9.2f} "
+              f"{stats['p95_ms']:>9.2f} {stats['p99_ms']:>9.2f} {stats['max_ms']:>9.2f}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,405 @@
+#!/usr/bin/env python3
+"""
+Open-loop load generator and traffic replay for the /ask path.
+
+Logs in as every persona that AuthHandler.create_default_users seeds
+(web-demo/auth_server.py DEMO_USERS) and replays a weighted query mix per
+persona, including follow-ups that reuse the persona's last conversation_id.
+Requests start on a fixed schedule at the target rate whether or not earlier
+ones have finished (open loop), and latency is measured from the scheduled
+start, so a backed-up system shows up in the percentiles instead of silently
+lowering the offered load.
+
+Reports an HDR-style latency histogram plus 429, error and guardrail
+intervention rates per persona and overall.
+
+Targets:
+  --offline        the local lambda_handler against the benchmark stubs; no AWS or network
+  --api-url URL    the deployed endpoint (WAF -> API Gateway -> Cognito -> Lambda), with ID
+                   tokens from the demo auth server's /auth (--auth-url)
+
+Usage:
+    python3 benchmarks/load_test.py --offline --rate 40 --duration 20
+    python3 benchmarks/load_test.py --api-url https://abc.execute-api.us-east-1.amazonaws.com/prod/ask \\
+        --auth-url http://localhost:8080/auth --rate 5 --duration 120 --json load.json
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, '..', '..', 'web-demo'))
+
+from auth_server import DEMO_USERS  # noqa: E402
+
+# Weighted query mix per persona role: (weight, query)
+QUERY_MIXES = {
+    'student': [
+        (5, 'whats photosynthesis'),
+        (4, 'explain the water cycle plz'),
+        (3, 'how do i solve quadratic equations'),
+        (2, 'wat is the best way to study for exams'),
+        (1, 'why do people get into fights at school'),
+        (1, 'tell me a scary story about a weapon')
+    ],
+    'teacher': [
+        (4, 'How do I teach photosynthesis to different grade levels?'),
+        (3, 'What classroom activities work for the water cycle?'),
+        (2, 'How should I assess group projects fairly?'),
+        (1, 'How do I handle a student who is being bullied?')
+    ],
+    'patient': [
+        (4, 'What medication should I take for chest pain?'),
+        (3, 'Is it normal to feel dizzy after a flu shot?'),
+        (2, 'How much ibuprofen can I take in a day?'),
+        (1, 'What are the warning signs of a stroke?')
+    ],
+    'provider': [
+        (4, 'What is the differential diagnosis for acute chest pain?'),
+        (3, 'First-line treatment for community-acquired pneumonia?'),
+        (2, 'Dosing considerations for anticoagulants in renal impairment?'),
+        (1, 'Current sepsis bundle recommendations?')
+    ]
+}
+DEFAULT_QUERY_MIX = [(1, 'What is DNA?'), (1, 'How does the immune system work?')]
+
+FOLLOW_UPS = ['can you explain that more simply', 'give me an example', 'why is that important', 'what else should I know']
+
+# Relative request share per persona (a classroom of students dominates real traffic)
+DEFAULT_PERSONA_WEIGHTS = {'student-123': 4, 'teacher-456': 2, 'patient-789': 2, 'provider-101': 1}
+
+def demo_password(user_id):
+    """Password start_demo.sh sets for the seeded demo users (student-123 -> Student123!)"""
+    return user_id.split('-')[0].capitalize() + '123!'
+
+class LatencyHistogram:
+    """
+    HDR-style histogram: values (microseconds) are bucketed log-linearly so every
+    recorded value keeps `significant_digits` of precision at any magnitude,
+    with constant memory and mergeable counts.
+    """
+
+    def __init__(self, significant_digits=3):
+        self.sub_bucket_bits = (2 * 10 ** significant_digits - 1).bit_length()
+        self.counts = defaultdict(int)
+        self.total = 0
+        self.max_value = 0
+        self.lock = threading.Lock()
+
+    def bucket(self, value):
+        exponent = max(0, value.bit_length() - self.sub_bucket_bits)
+        return exponent, value >> exponent
+
+    def record(self, value_us):
+        value = max(0, int(value_us))
+        key = self.bucket(value)
+        with self.lock:
+            self.counts[key] += 1
+            self.total += 1
+            self.max_value = max(self.max_value, value)
+
+    def merge(self, other):
+        with other.lock:
+            counts, total, max_value = dict(other.counts), other.total, other.max_value
+        with self.lock:
+            for key, count in counts.items():
+                self.counts[key] += count
+            self.total += total
+            self.max_value = max(self.max_value, max_value)
+
+    def value_at_percentile(self, pct):
+        """Highest value equivalent to the bucket containing the pct-th percentile"""
+        with self.lock:
+            if not self.total:
+                return 0
+            target = max(1, int(round(pct / 100.0 * self.total)))
+            seen = 0
+            for exponent, sub_bucket in sorted(self.counts):
+                seen += self.counts[(exponent, sub_bucket)]
+                if seen >= target:
+                    return min(self.max_value, ((sub_bucket + 1) << exponent) - 1)
+            return self.max_value
+
+    def percentiles_ms(self, pcts=(50, 75, 90, 95, 99, 99.9)):
+        report = {f'p{pct:g}': self.value_at_percentile(pct) / 1000.0 for pct in pcts}
+        report['max'] = self.max_value / 1000.0
+        return report
+
+    def distribution(self, pcts=(0, 10, 25, 50, 75, 90, 95, 99, 99.5, 99.9, 99.99, 100)):
+        """Rows of (value_ms, percentile, total_count), like HdrHistogram's percentile output"""
+        return [(self.value_at_percentile(pct) / 1000.0, pct, self.total) for pct in pcts]
+
+class PersonaStats:
+    def __init__(self):
+        self.histogram = LatencyHistogram()
+        self.statuses = defaultdict(int)
+        self.requests = 0
+        self.follow_ups = 0
+        self.interventions = 0
+        self.cache_hits = 0
+        self.models = defaultdict(int)
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.lock = threading.Lock()
+
+    def record(self, latency_us, status, body, follow_up):
+        self.histogram.record(latency_us)
+        metadata = body.get('metadata', {}) if isinstance(body, dict) else {}
+        with self.lock:
+            self.requests += 1
+            self.statuses[status] += 1
+            self.follow_ups += follow_up
+            if metadata.get('guardrail_action') == 'INTERVENED' or metadata.get('prescreened'):
+                self.interventions += 1
+            self.cache_hits += bool(metadata.get('cache_hit'))
+            self.hedged += bool(metadata.get('hedged'))
+            self.hedge_wins += metadata.get('hedge_leg') == 'hedge'
+            if metadata.get('model_id'):
+                self.models[metadata['model_id']] += 1
+
+    def summary(self):
+        ok = self.statuses.get(200, 0)
+        throttled = self.statuses.get(429, 0)
+        errors = self.requests - ok - throttled
+        rate = lambda n: n / self.requests if self.requests else 0.0
+        return dict(
+            requests=self.requests,
+            follow_ups=self.follow_ups,
+            statuses={str(code): count for code, count in sorted(self.statuses.items())},
+            ok_rate=rate(ok),
+            throttle_rate=rate(throttled),
+            error_rate=rate(errors),
+            intervention_rate=self.interventions / ok if ok else 0.0,
+            cache_hit_rate=self.cache_hits / ok if ok else 0.0,
+            models=dict(self.models),
+            hedged=self.hedged,
+            hedge_wins=self.hedge_wins,
+            latency_ms=self.histogram.percentiles_ms()
+        )
+
+class OfflineTarget:
+    """lambda_handler in-process with stubbed DynamoDB and Bedrock, seeded with DEMO_USERS"""
+
+    def __init__(self, args):
+        # The handler's per-user and per-segment limits are part of what is measured
+        os.environ.setdefault('RATE_LIMIT_ENABLED', 'true')
+        import handler_bench
+        from stubs import TABLE_KEYS, StubBedrock, StubDynamoDB
+
+        self.app = handler_bench.app
+        self.event = handler_bench.api_gateway_event
+        table_names = {env: os.environ.get(env) for env in TABLE_KEYS}
+        self.app.dynamodb = StubDynamoDB(table_names, latency_ms=args.dynamodb_ms, jitter_ms=args.dynamodb_ms / 3,
+                                         profiles=DEMO_USERS)
+        self.app.bedrock = StubBedrock(latency_ms=args.bedrock_ms, jitter_ms=args.bedrock_ms / 4,
+                                       throttle_rate=args.throttle_rate, intervention_rate=args.intervention_rate,
+                                       throttle_models=args.throttle_models.split(',') if args.throttle_models else None,
+                                       slow_rate=args.slow_rate)
+
+    def login(self, user_id, password):
+        # The Cognito authorizer's claims are synthesized directly into the event
+        return user_id
+
+    def ask(self, token, body):
+        response = self.app.lambda_handler(self.event(token, body), None)
+        return response['statusCode'], json.loads(response['body'] or '{}')
+
+class HttpTarget:
+    """Deployed API, authenticated with ID tokens from the demo auth server"""
+
+    def __init__(self, args):
+        self.api_url = args.api_url
+        self.auth_url = args.auth_url
+        self.timeout = args.timeout
+
+    def post(self, url, payload, headers=None):
+        request = urllib.request.Request(
+            url, data=json.dumps(payload).encode(), method='POST',
+            headers=dict({'Content-Type': 'application/json'}, **(headers or {}))
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return response.status, json.loads(response.read() or b'{}')
+        except urllib.error.HTTPError as e:
+            try:
+                return e.code, json.loads(e.read() or b'{}')
+            except ValueError:
+                return e.code, {}
+        except (urllib.error.URLError, OSError, ValueError):
+            # Transport failures (timeouts, resets) are reported as status 0
+            return 0, {}
+
+    def login(self, user_id, password):
+        status, body = self.post(self.auth_url, {'username': user_id, 'password': password})
+        if status != 200 or 'idToken' not in body:
+            raise RuntimeError(f"Login failed for {user_id}: HTTP {status}")
+        return body['idToken']
+
+    def ask(self, token, body):
+        return self.post(self.api_url, body, {'Authorization': f'Bearer {token}'})
+
+def weighted_choice(rng, weighted):
+    total = sum(weight for weight, _ in weighted)
+    point = rng.uniform(0, total)
+    for weight, value in weighted:
+        point -= weight
+        if point <= 0:
+            return value
+    return weighted[-1][1]
+
+def parse_weights(text):
+    weights = {}
+    for part in filter(None, (text or '').split(',')):
+        user_id, _, weight = part.partition('=')
+        weights[user_id.strip()] = float(weight)
+    return weights
+
+def build_schedule(rate, duration, arrival, rng):
+    """Offsets (s) of every request start: Poisson arrivals or an evenly spaced stream"""
+    offsets = []
+    t = 0.0
+    while True:
+        t += rng.expovariate(rate) if arrival == 'poisson' else 1.0 / rate
+        if t >= duration:
+            return offsets
+        offsets.append(t)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    target_group = parser.add_mutually_exclusive_group(required=True)
+    target_group.add_argument('--offline', action='store_true', help='drive the local lambda_handler with stubbed AWS')
+    target_group.add_argument('--api-url', help='deployed /ask endpoint')
+    parser.add_argument('--auth-url', default='http://localhost:8080/auth', help='demo auth server /auth endpoint')
+    parser.add_argument('--rate', type=float, default=10.0, help='target requests per second')
+    parser.add_argument('--duration', type=float, default=30.0, help='seconds of scheduled traffic')
+    parser.add_argument('--arrival', choices=['poisson', 'uniform'], default='poisson')
+    parser.add_argument('--max-in-flight', type=int, default=256, help='worker threads issuing requests')
+    parser.add_argument('--personas', help='persona weights, e.g. student-123=4,teacher-456=1 (default: classroom-heavy)')
+    parser.add_argument('--followup-rate', type=float, default=0.3, help='probability a request follows up the last answer')
+    parser.add_argument('--timeout', type=float, default=35.0, help='HTTP timeout per request (s)')
+    parser.add_argument('--seed', type=int, default=11)
+    parser.add_argument('--dynamodb-ms', type=float, default=8.0, help='offline: mean DynamoDB latency')
+    parser.add_argument('--bedrock-ms', type=float, default=900.0, help='offline: mean Bedrock latency')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='offline: Bedrock throttling probability')
+    parser.add_argument('--throttle-models', help='offline: comma-separated model id substrings that throttle (default: all)')
+    parser.add_argument('--slow-rate', type=float, default=0.0, help='offline: probability a Bedrock call takes 5x longer')
+    parser.add_argument('--intervention-rate', type=float, default=0.05, help='offline: guardrail intervention probability')
+    parser.add_argument('--distribution', action='store_true', help='print the full percentile distribution')
+    parser.add_argument('--json', help='also write the report as JSON to this path')
+    parser.add_argument('--verbose', action='store_true', help='keep the handler logs in offline mode')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    target = OfflineTarget(args) if args.offline else HttpTarget(args)
+    # After OfflineTarget: importing app configures the root logger
+    if args.offline and not args.verbose:
+        logging.getLogger().setLevel(logging.CRITICAL)
+
+    weights = dict(DEFAULT_PERSONA_WEIGHTS, **parse_weights(args.personas))
+    personas = [user for user in DEMO_USERS if weights.get(user['user_id'], 0) > 0]
+    tokens = {user['user_id']: target.login(user['user_id'], demo_password(user['user_id'])) for user in personas}
+    persona_mix = [(weights[user['user_id']], user) for user in personas]
+
+    stats = {user['user_id']: PersonaStats() for user in personas}
+    conversations = {}
+    conversations_lock = threading.Lock()
+
+    schedule = build_schedule(args.rate, args.duration, args.arrival, rng)
+    # Draw every request up front so runs with the same seed replay the same traffic
+    plan = []
+    for offset in schedule:
+        user = weighted_choice(rng, persona_mix)
+        plan.append((offset, user, rng.random(), rng.random()))
+
+    def issue(scheduled_at, user, follow_draw, query_draw):
+        user_id = user['user_id']
+        with conversations_lock:
+            conversation_id = conversations.get(user_id)
+        follow_up = bool(conversation_id) and follow_draw < args.followup_rate
+        query_rng = random.Random(query_draw)
+        if follow_up:
+            body = {'query': query_rng.choice(FOLLOW_UPS), 'conversation_id': conversation_id}
+        else:
+            body = {'query': weighted_choice(query_rng, QUERY_MIXES.get(user['role'], DEFAULT_QUERY_MIX))}
+
+        status, response = target.ask(tokens[user_id], body)
+        latency_us = (time.perf_counter() - scheduled_at) * 1e6
+        stats[user_id].record(latency_us, status, response, follow_up)
+        if status == 200 and response.get('conversation_id'):
+            with conversations_lock:
+                conversations[user_id] = response['conversation_id']
+
+    print(f"target={'offline handler' if args.offline else args.api_url} rate={args.rate}/s "
+          f"duration={args.duration}s scheduled={len(plan)} personas={[u['user_id'] for u in personas]}")
+
+    max_lag = 0.0
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.max_in_flight, thread_name_prefix='load') as pool:
+        for offset, user, *draws in plan:
+            scheduled_at = started + offset
+            delay = scheduled_at - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                max_lag = max(max_lag, -delay)
+            pool.submit(issue, scheduled_at, user, *draws)
+    elapsed = time.perf_counter() - started
+    if args.offline and isinstance(target.app.audit_queue, target.app.LocalAuditQueue):
+        target.app.audit_queue.flush()
+
+    overall = PersonaStats()
+    for persona_stats in stats.values():
+        overall.histogram.merge(persona_stats.histogram)
+        overall.requests += persona_stats.requests
+        overall.follow_ups += persona_stats.follow_ups
+        overall.interventions += persona_stats.interventions
+        overall.cache_hits += persona_stats.cache_hits
+        overall.hedged += persona_stats.hedged
+        overall.hedge_wins += persona_stats.hedge_wins
+        for model_id, count in persona_stats.models.items():
+            overall.models[model_id] += count
+        for code, count in persona_stats.statuses.items():
+            overall.statuses[code] += count
+
+    report = {
+        'config': vars(args),
+        'elapsed_s': elapsed,
+        'achieved_rate': overall.requests / elapsed if elapsed else 0.0,
+        'max_dispatch_lag_ms': max_lag * 1000,
+        'overall': overall.summary(),
+        'personas': {user_id: persona_stats.summary() for user_id, persona_stats in stats.items()}
+    }
+
+    print(f"completed={overall.requests} elapsed={elapsed:.1f}s achieved={report['achieved_rate']:.1f} req/s "
+          f"max dispatch lag={report['max_dispatch_lag_ms']:.0f}ms")
+    print(f"{'persona':<14} {'reqs':>6} {'ok%':>6} {'429%':>6} {'err%':>6} {'intv%':>6} "
+          f"{'p50':>8} {'p90':>8} {'p99':>8} {'p99.9':>8} {'max':>8}")
+    for name, summary in list(report['personas'].items()) + [('overall', report['overall'])]:
+        latency = summary['latency_ms']
+        print(f"{name:<14} {summary['requests']:>6} {summary['ok_rate'] * 100:>6.1f} "
+              f"{summary['throttle_rate'] * 100:>6.1f} {summary['error_rate'] * 100:>6.1f} "
+              f"{summary['intervention_rate'] * 100:>6.1f} {latency['p50']:>8.1f} {latency['p90']:>8.1f} "
+              f"{latency['p99']:>8.1f} {latency['p99.9']:>8.1f} {latency['max']:>8.1f}")
+    print(f"answers by model: {report['overall']['models']}")
+    print(f"hedged: {overall.hedged} ({overall.hedge_wins} won by the hedge leg)")
+
+    if args.distribution:
+        print(f"\n{'value_ms':>12} {'percentile':>12} {'total':>8}")
+        for value_ms, pct, total in overall.histogram.distribution():
+            print(f"{value_ms:>12.2f} {pct:>12g} {total:>8}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == '__main__':
+    main()
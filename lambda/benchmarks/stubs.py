@@ -0,0 +1,213 @@
+"""
+Local stand-ins for the DynamoDB resource and the bedrock-runtime client used
+by app.py, with configurable latency, throttling and guardrail interventions.
+Used by the offline benchmark harness; no AWS credentials or network needed.
+"""
+import io
+import json
+import random
+import re
+import threading
+import time
+
+from botocore.exceptions import ClientError
+
+# Hash key per table, looked up by the table's env var in app.py
+TABLE_KEYS = {
+    'USER_TABLE': 'user_id',
+    'AUDIT_TABLE': 'interaction_id',
+    'RESPONSE_CACHE_TABLE': 'cache_key',
+    'CONVERSATION_TABLE': 'conversation_id'
+}
+
+DEMO_PROFILES = [
+    # One profile per branch of select_guardrail_configuration
+    {'user_id': 'child-001', 'name': 'Child', 'birth_date': '2017-04-02', 'role': 'student', 'industry': 'education', 'device': 'tablet'},
+    {'user_id': 'student-123', 'name': 'Alex (Student)', 'birth_date': '2011-05-15', 'role': 'student', 'industry': 'education', 'device': 'desktop'},
+    {'user_id': 'provider-101', 'name': 'Dr. Smith (Doctor)', 'birth_date': '1979-03-18', 'role': 'provider', 'industry': 'healthcare', 'device': 'desktop'},
+    {'user_id': 'patient-789', 'name': 'John (Patient)', 'birth_date': '1974-12-10', 'role': 'patient', 'industry': 'healthcare', 'device': 'mobile'},
+    {'user_id': 'teacher-456', 'name': 'Sarah (Teacher)', 'birth_date': '1984-08-22', 'role': 'teacher', 'industry': 'education', 'device': 'desktop'},
+    {'user_id': 'senior-202', 'name': 'Pat (Retiree)', 'birth_date': '1950-01-30', 'role': 'general', 'industry': 'general', 'device': 'desktop'}
+]
+
+def simulated_delay(latency_ms, jitter_ms):
+    """Sleep for latency_ms +/- a uniform jitter (never negative)"""
+    delay = latency_ms + random.uniform(-jitter_ms, jitter_ms)
+    if delay > 0:
+        time.sleep(delay / 1000.0)
+
+class StubBatchWriter:
+    def __init__(self, table):
+        self.table = table
+        self.items = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        # One simulated BatchWriteItem round trip per 25 items
+        for _ in range(0, len(self.items), 25):
+            simulated_delay(self.table.latency_ms, self.table.jitter_ms)
+        for item in self.items:
+            self.table.store(item)
+
+    def put_item(self, Item):
+        self.items.append(Item)
+
+    def delete_item(self, Key):
+        self.table.items.pop(Key[self.table.key_name], None)
+
+class StubTable:
+    """In-memory table supporting the calls app.py makes"""
+
+    def __init__(self, name, key_name, latency_ms, jitter_ms):
+        self.name = name
+        self.key_name = key_name
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.items = {}
+        self.lock = threading.Lock()
+
+    def store(self, item):
+        with self.lock:
+            self.items[item[self.key_name]] = dict(item)
+
+    def get_item(self, Key, **kwargs):
+        simulated_delay(self.latency_ms, self.jitter_ms)
+        with self.lock:
+            item = self.items.get(Key[self.key_name])
+        return {'Item': dict(item)} if item else {}
+
+    def put_item(self, Item, **kwargs):
+        simulated_delay(self.latency_ms, self.jitter_ms)
+        self.store(Item)
+        return {}
+
+    def update_item(self, Key, UpdateExpression='', ExpressionAttributeNames=None,
+                    ExpressionAttributeValues=None, **kwargs):
+        # Applies plain `SET a = :a, #b = :b` assignments; conditions always pass
+        simulated_delay(self.latency_ms, self.jitter_ms)
+        names = ExpressionAttributeNames or {}
+        values = ExpressionAttributeValues or {}
+        with self.lock:
+            item = self.items.setdefault(Key[self.key_name], dict(Key))
+            for name, placeholder in re.findall(r'(#?\w+)\s*=\s*(:\w+)', UpdateExpression):
+                item[names.get(name, name)] = values[placeholder]
+        return {}
+
+    def delete_item(self, Key, **kwargs):
+        simulated_delay(self.latency_ms, self.jitter_ms)
+        with self.lock:
+            self.items.pop(Key[self.key_name], None)
+        return {}
+
+    def scan(self, **kwargs):
+        simulated_delay(self.latency_ms, self.jitter_ms)
+        with self.lock:
+            return {'Items': [dict(item) for item in self.items.values()]}
+
+    def batch_writer(self, **kwargs):
+        return StubBatchWriter(self)
+
+class StubDynamoDB:
+    """Stand-in for boto3.resource('dynamodb')"""
+
+    def __init__(self, table_names, latency_ms=8.0, jitter_ms=3.0, profiles=DEMO_PROFILES):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        key_by_table = {table_names[env]: key for env, key in TABLE_KEYS.items() if table_names.get(env)}
+        self.tables = {
+            name: StubTable(name, key, latency_ms, jitter_ms) for name, key in key_by_table.items()
+        }
+        users = self.tables[table_names['USER_TABLE']]
+        for profile in profiles:
+            users.store(profile)
+
+    def Table(self, name):
+        return self.tables[name]
+
+    def batch_write_item(self, RequestItems, **kwargs):
+        # One simulated round trip; every put is processed
+        simulated_delay(self.latency_ms, self.jitter_ms)
+        for name, requests in RequestItems.items():
+            for request in requests:
+                self.tables[name].store(request['PutRequest']['Item'])
+        return {'UnprocessedItems': {}}
+
+# Generation time relative to latency_ms, by substring of the model id
+MODEL_LATENCY_FACTORS = {'haiku': 0.35}
+
+class StubBedrock:
+    """
+    Stand-in for the bedrock-runtime client. latency_ms is the total generation
+    time (scaled per model by MODEL_LATENCY_FACTORS); throttle_rate and
+    intervention_rate are probabilities per call. throttle_models limits
+    throttling to model ids containing one of the given substrings. slow_rate
+    of the calls take slow_factor times longer (the tail that hedging targets).
+    """
+
+    def __init__(self, latency_ms=1200.0, jitter_ms=300.0, throttle_rate=0.0, intervention_rate=0.0,
+                 throttle_models=None, slow_rate=0.0, slow_factor=5.0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.throttle_rate = throttle_rate
+        self.intervention_rate = intervention_rate
+        self.throttle_models = throttle_models
+        self.slow_rate = slow_rate
+        self.slow_factor = slow_factor
+        self.calls = 0
+        self.calls_by_model = {}
+        self.throttled = 0
+        self.interventions = 0
+        self.lock = threading.Lock()
+
+    def _latency_factor(self, model_id):
+        factor = 1.0
+        for name, model_factor in MODEL_LATENCY_FACTORS.items():
+            if name in (model_id or ''):
+                factor = model_factor
+                break
+        if random.random() < self.slow_rate:
+            factor *= self.slow_factor
+        return factor
+
+    def _throttles(self, model_id):
+        if self.throttle_models is None:
+            return True
+        return any(name in (model_id or '') for name in self.throttle_models)
+
+    def _outcome(self, operation, model_id):
+        with self.lock:
+            self.calls += 1
+            self.calls_by_model[model_id] = self.calls_by_model.get(model_id, 0) + 1
+            if self._throttles(model_id) and random.random() < self.throttle_rate:
+                self.throttled += 1
+                throttled = True
+            else:
+                throttled = False
+                intervened = random.random() < self.intervention_rate
+                if intervened:
+                    self.interventions += 1
+        if throttled:
+            simulated_delay(20, 10)
+            raise ClientError(
+                {'Error': {'Code': 'ThrottlingException', 'Message': 'Too many requests'},
+                 'ResponseMetadata': {'RetryAttempts': 0}},
+                operation
+            )
+        return intervened
+
+    def _text(self, intervened):
+        if intervened:
+            return "Sorry, the model cannot answer this question."
+        return "This is a simulated answer from the local Bedrock stand-in. " * 4
+
+    def invoke_model(self, **kwargs):
+        intervened = self._outcome('InvokeModel', kwargs.get('modelId'))
+        factor = self._latency_factor(kwargs.get('modelId'))
+        simulated_delay(self.latency_ms * factor, self.jitter_ms * factor)
+        body = {
+            'content': [{'type': 'text', 'text': self._text(intervened)}],
+            'amazon-bedrock-guardrailAction': 'INTERVENED' if intervened else 'NONE'
+        }
+        return {'body': io.BytesIO(json.dumps(body).encode()), 'ResponseMetadata': {'RetryAttempts': 0}}
@@ -1,8 +1,19 @@
 #!/bin/bash
 
 # Build Lambda deployment package with dependencies
+#
+# boto3/botocore are provided by the Lambda Python runtime, so by default only
+# the function code is shipped. Set BUNDLE_BOTO3=1 to pin the SDK from
+# requirements.txt instead; the bundled botocore is then stripped down to the
+# service models app.py actually calls (KEEP_SERVICES).
+set -e
 echo "Building Lambda deployment package..."
 
+# Interpreter matching the Lambda runtime, used to precompile the bytecode
+PYTHON=${PYTHON:-python3.11}
+BUNDLE_BOTO3=${BUNDLE_BOTO3:-0}
+KEEP_SERVICES=${KEEP_SERVICES:-"dynamodb bedrock-runtime sqs sts"}
+
 # Clean up previous builds
 rm -rf package/
 rm -f app.zip
@@ -11,14 +22,39 @@ rm -f app.zip
 mkdir -p package
 
 # Install dependencies to package directory
-pip install -r requirements.txt -t package/
+if [ "$BUNDLE_BOTO3" = "1" ]; then
+    pip install -r requirements.txt -t package/ --no-compile
+
+    # Drop service models and packaging metadata the function never loads
+    for service_dir in package/botocore/data/*/; do
+        service=$(basename "$service_dir")
+        if [[ " $KEEP_SERVICES " != *" $service "* ]]; then
+            rm -rf "$service_dir"
+        fi
+    done
+    for service_dir in package/boto3/data/*/; do
+        service=$(basename "$service_dir")
+        if [[ " $KEEP_SERVICES " != *" $service "* ]]; then
+            rm -rf "$service_dir"
+        fi
+    done
+    rm -rf package/*.dist-info package/bin
+fi
+
+# Copy Lambda function code and routing policy
+cp app.py policy.json package/
 
-# Copy Lambda function code
-cp app.py package/
+# Precompile bytecode: /var/task is read-only, so without shipped .pyc files every
+# cold start recompiles each module. unchecked-hash skips the source mtime check.
+if command -v "$PYTHON" > /dev/null; then
+    "$PYTHON" -m compileall -q -j 0 --invalidation-mode unchecked-hash package/
+else
+    echo "Warning: $PYTHON not found, shipping without precompiled bytecode"
+fi
 
 # Create deployment zip
 cd package
-zip -r ../app.zip .
+zip -qr ../app.zip .
 cd ..
 
-echo "Lambda package built: app.zip"
\ No newline at end of file
+echo "Lambda package built: app.zip ($(du -h app.zip | cut -f1))"
@@ -41,6 +41,7 @@ resource "aws_bedrock_guardrail" "child_protection" {
     }
   }
 
+  # Keep in sync with denied_terms in lambda/policy.json (local pre-screen)
   word_policy_config {
     words_config {
       text = "kill"
@@ -13,6 +13,17 @@ resource "aws_cloudwatch_log_group" "lambda" {
   })
 }
 
+resource "aws_cloudwatch_log_group" "audit_consumer" {
+  name              = "/aws/lambda/${local.name_prefix}-audit-consumer-${local.suffix}"
+  retention_in_days = var.cloudwatch_config.log_retention_days
+  kms_key_id        = var.cloudwatch_config.enable_kms_encryption ? aws_kms_key.main.arn : null
+
+  tags = merge(local.common_tags, {
+    Name    = "${local.name_prefix}-audit-consumer-logs"
+    Purpose = "Audit consumer logs"
+  })
+}
+
 # CloudWatch Log Group for API Gateway (conditional)
 resource "aws_cloudwatch_log_group" "api_gateway" {
   count             = var.cloudwatch_config.enable_kms_encryption ? 1 : 0
@@ -70,4 +81,123 @@ resource "aws_cloudwatch_metric_alarm" "lambda_duration" {
     Name    = "${local.name_prefix}-lambda-duration-alarm"
     Purpose = "Monitor Lambda function duration"
   })
-}
\ No newline at end of file
+}
+
+# Per-stage latency metrics emitted by the Lambda as Embedded Metric Format
+locals {
+  metrics_namespace = "AgeResponsiveAI"
+
+  stage_latency_metrics = [
+    "RequestLatency",
+    "UserProfileLatency",
+    "ConversationHistoryLatency",
+    "GrammarCorrectionLatency",
+    "PromptBuildLatency",
+    "BedrockLatency",
+    "TurnPersistLatency",
+    "BatchLatency"
+  ]
+}
+
+# CloudWatch Dashboard for per-stage latency by age group and protection level
+resource "aws_cloudwatch_dashboard" "stage_latency" {
+  dashboard_name = "${local.name_prefix}-stage-latency"
+
+  dashboard_body = jsonencode({
+    widgets = concat(
+      [
+        {
+          type   = "metric"
+          x      = 0
+          y      = 0
+          width  = 24
+          height = 6
+          properties = {
+            title  = "Request latency p50 / p99 by segment"
+            region = data.aws_region.current.name
+            view   = "timeSeries"
+            period = 300
+            metrics = [
+              [{ expression = "SEARCH('{${local.metrics_namespace},AgeGroup,ProtectionLevel} MetricName=\"RequestLatency\"', 'p50', 300)", id = "p50", label = "p50" }],
+              [{ expression = "SEARCH('{${local.metrics_namespace},AgeGroup,ProtectionLevel} MetricName=\"RequestLatency\"', 'p99', 300)", id = "p99", label = "p99" }]
+            ]
+          }
+        }
+      ],
+      [
+        for index, metric in slice(local.stage_latency_metrics, 1, length(local.stage_latency_metrics)) : {
+          type   = "metric"
+          x      = (index % 2) * 12
+          y      = 6 + floor(index / 2) * 6
+          width  = 12
+          height = 6
+          properties = {
+            title  = "${metric} p50 / p99"
+            region = data.aws_region.current.name
+            view   = "timeSeries"
+            period = 300
+            metrics = [
+              [{ expression = "SEARCH('{${local.metrics_namespace},AgeGroup,ProtectionLevel} MetricName=\"${metric}\"', 'p50', 300)", id = "p50", label = "p50" }],
+              [{ expression = "SEARCH('{${local.metrics_namespace},AgeGroup,ProtectionLevel} MetricName=\"${metric}\"', 'p99', 300)", id = "p99", label = "p99" }]
+            ]
+          }
+        }
+      ],
+      [
+        {
+          type   = "metric"
+          x      = 0
+          y      = 6 + ceil((length(local.stage_latency_metrics) - 1) / 2) * 6
+          width  = 24
+          height = 6
+          properties = {
+            title  = "Bedrock latency p50 / p99 by model"
+            region = data.aws_region.current.name
+            view   = "timeSeries"
+            period = 300
+            metrics = [
+              [{ expression = "SEARCH('{${local.metrics_namespace},ModelId} MetricName=\"BedrockLatency\"', 'p50', 300)", id = "p50", label = "p50" }],
+              [{ expression = "SEARCH('{${local.metrics_namespace},ModelId} MetricName=\"BedrockLatency\"', 'p99', 300)", id = "p99", label = "p99" }]
+            ]
+          }
+        },
+        {
+          type   = "metric"
+          x      = 0
+          y      = 12 + ceil((length(local.stage_latency_metrics) - 1) / 2) * 6
+          width  = 12
+          height = 6
+          properties = {
+            title  = "Bedrock retries, breaker short-circuits and open breakers"
+            region = data.aws_region.current.name
+            view   = "timeSeries"
+            period = 300
+            metrics = [
+              [{ expression = "SUM(SEARCH('{${local.metrics_namespace},ModelId} MetricName=\"BedrockRetries\"', 'Sum', 300))", id = "retries", label = "Retries" }],
+              [{ expression = "SUM(SEARCH('{${local.metrics_namespace},ModelId} MetricName=\"BreakerShortCircuits\"', 'Sum', 300))", id = "short_circuits", label = "Short-circuits" }],
+              [{ expression = "MAX(SEARCH('{${local.metrics_namespace},ModelId} MetricName=\"BreakersOpen\"', 'Maximum', 300))", id = "open", label = "Open breakers (max per container)" }]
+            ]
+          }
+        },
+        {
+          type   = "metric"
+          x      = 12
+          y      = 12 + ceil((length(local.stage_latency_metrics) - 1) / 2) * 6
+          width  = 12
+          height = 6
+          properties = {
+            title  = "Response cache hit rate (%)"
+            region = data.aws_region.current.name
+            view   = "timeSeries"
+            period = 300
+            metrics = [
+              [{ expression = "SUM(SEARCH('{${local.metrics_namespace},AgeGroup,ProtectionLevel} MetricName=\"CacheHit\"', 'Sum', 300))", id = "hits", visible = false }],
+              [{ expression = "SUM(SEARCH('{${local.metrics_namespace},AgeGroup,ProtectionLevel} MetricName=\"CacheMiss\"', 'Sum', 300))", id = "misses", visible = false }],
+              [{ expression = "100 * hits / (hits + misses)", id = "hit_rate", label = "Hit rate" }]
+            ]
+          }
+        }
+      ]
+    )
+  })
+}
@@ -65,4 +65,116 @@ resource "aws_dynamodb_table" "audit" {
     Name    = "${local.name_prefix}-audit-table"
     Purpose = "Interaction audit and compliance logging"
   })
-}
\ No newline at end of file
+}
+
+# Response Cache Table (shared across Lambda containers)
+resource "aws_dynamodb_table" "response_cache" {
+  name           = "${local.name_prefix}-response-cache-${local.suffix}"
+  billing_mode   = var.dynamodb_config.billing_mode
+  hash_key       = "cache_key"
+
+  attribute {
+    name = "cache_key"
+    type = "S"
+  }
+
+  # TTL for automatic expiry of cached responses
+  ttl {
+    attribute_name = "ttl"
+    enabled        = true
+  }
+
+  server_side_encryption {
+    enabled     = true
+    kms_key_arn = aws_kms_key.main.arn
+  }
+
+  tags = merge(local.common_tags, {
+    Name    = "${local.name_prefix}-response-cache-table"
+    Purpose = "Guardrail-scoped model response cache"
+  })
+}
+
+# Conversation State Table (one item per conversation with the recent turns)
+resource "aws_dynamodb_table" "conversations" {
+  name           = "${local.name_prefix}-conversations-${local.suffix}"
+  billing_mode   = var.dynamodb_config.billing_mode
+  hash_key       = "conversation_id"
+
+  attribute {
+    name = "conversation_id"
+    type = "S"
+  }
+
+  # TTL for automatic cleanup of idle conversations
+  ttl {
+    attribute_name = "ttl"
+    enabled        = true
+  }
+
+  server_side_encryption {
+    enabled     = true
+    kms_key_arn = aws_kms_key.main.arn
+  }
+
+  tags = merge(local.common_tags, {
+    Name    = "${local.name_prefix}-conversations-table"
+    Purpose = "Conversation state for follow-up questions"
+  })
+}
+
+# Rate Limit Table (one token bucket per user and per age_group/role segment)
+resource "aws_dynamodb_table" "rate_limits" {
+  name           = "${local.name_prefix}-rate-limits-${local.suffix}"
+  billing_mode   = var.dynamodb_config.billing_mode
+  hash_key       = "bucket_key"
+
+  attribute {
+    name = "bucket_key"
+    type = "S"
+  }
+
+  # TTL removes buckets an hour after they have fully refilled
+  ttl {
+    attribute_name = "ttl"
+    enabled        = true
+  }
+
+  server_side_encryption {
+    enabled     = true
+    kms_key_arn = aws_kms_key.main.arn
+  }
+
+  tags = merge(local.common_tags, {
+    Name    = "${local.name_prefix}-rate-limits-table"
+    Purpose = "Per-user and per-segment Bedrock rate limiting"
+  })
+}
+
+# Idempotency records: in-progress lease, then the stored response, per user and Idempotency-Key
+resource "aws_dynamodb_table" "idempotency" {
+  name           = "${local.name_prefix}-idempotency-${local.suffix}"
+  billing_mode   = var.dynamodb_config.billing_mode
+  hash_key       = "idempotency_key"
+
+  attribute {
+    name = "idempotency_key"
+    type = "S"
+  }
+
+  # TTL removes stored responses once clients can no longer retry with the key
+  ttl {
+    attribute_name = "ttl"
+    enabled        = true
+  }
+
+  server_side_encryption {
+    enabled     = true
+    kms_key_arn = aws_kms_key.main.arn
+  }
+
+  tags = merge(local.common_tags, {
+    Name    = "${local.name_prefix}-idempotency-table"
+    Purpose = "Idempotency-Key request deduplication"
+  })
+}
@@ -37,9 +37,13 @@ resource "aws_iam_role_policy" "lambda_exec" {
           "bedrock:InvokeModel",
           "bedrock:InvokeModelWithResponseStream"
         ]
-        Resource = [
-          "arn:aws:bedrock:${data.aws_region.current.name}::foundation-model/${var.bedrock_model_id}"
-        ]
+        Resource = concat(
+          [
+            for model_id in local.bedrock_model_ids :
+            "arn:aws:bedrock:${data.aws_region.current.name}::foundation-model/${model_id}"
+          ],
+          local.bedrock_hedge_resources
+        )
       },
       {
         Effect = "Allow"
@@ -59,11 +63,29 @@ resource "aws_iam_role_policy" "lambda_exec" {
         Action = [
           "dynamodb:GetItem",
           "dynamodb:PutItem",
-          "dynamodb:Query"
+          "dynamodb:UpdateItem",
+          "dynamodb:DeleteItem",
+          "dynamodb:BatchWriteItem"
         ]
         Resource = [
           aws_dynamodb_table.users.arn,
-          aws_dynamodb_table.audit.arn
+          aws_dynamodb_table.audit.arn,
+          aws_dynamodb_table.response_cache.arn,
+          aws_dynamodb_table.conversations.arn,
+          aws_dynamodb_table.rate_limits.arn,
+          aws_dynamodb_table.idempotency.arn
+        ]
+      },
+      {
+        Effect = "Allow"
+        Action = [
+          "sqs:SendMessage",
+          "sqs:ReceiveMessage",
+          "sqs:DeleteMessage",
+          "sqs:GetQueueAttributes"
+        ]
+        Resource = [
+          aws_sqs_queue.audit.arn
         ]
       },
       {
@@ -91,6 +113,27 @@ resource "aws_iam_role_policy" "lambda_exec" {
 }
 
 
+# Every model the routing policy can send a request to (primary and fallback models)
+locals {
+  routing_policy = jsondecode(file("${path.root}/../../../lambda/policy.json"))
+
+  bedrock_model_ids = distinct(compact(flatten(concat(
+    [var.bedrock_model_id],
+    [try(local.routing_policy.defaults.model_id, "")],
+    try(local.routing_policy.defaults.fallback_model_ids, []),
+    [for segment in local.routing_policy.segments : concat([try(segment.model_id, "")], try(segment.fallback_model_ids, []))]
+  ))))
+
+  # Hedge legs invoke the primary models through cross-region inference profiles,
+  # which route to the model in any of the profile's regions
+  bedrock_hedge_resources = var.bedrock_hedging.enabled ? flatten([
+    for model_id in local.bedrock_model_ids : [
+      "arn:aws:bedrock:${data.aws_region.current.name}:${data.aws_caller_identity.current.account_id}:inference-profile/${var.bedrock_hedging.profile_prefix}${model_id}",
+      "arn:aws:bedrock:*::foundation-model/${model_id}"
+    ]
+  ]) : []
+}
+
 # Lambda deployment package
 data "archive_file" "lambda_zip" {
   type        = "zip"
@@ -123,10 +166,61 @@ resource "aws_lambda_function" "main" {
       HEALTHCARE_PATIENT_GUARDRAIL_ID     = aws_bedrock_guardrail.healthcare_patient.guardrail_id
       ADULT_GENERAL_GUARDRAIL_ID          = aws_bedrock_guardrail.adult_general.guardrail_id
       DEFAULT_GUARDRAIL_ID                = aws_bedrock_guardrail.adult_general.guardrail_id
-      
+
       # Database tables
-      USER_TABLE  = aws_dynamodb_table.users.name
-      AUDIT_TABLE = aws_dynamodb_table.audit.name
+      USER_TABLE         = aws_dynamodb_table.users.name
+      AUDIT_TABLE        = aws_dynamodb_table.audit.name
+      CONVERSATION_TABLE = aws_dynamodb_table.conversations.name
+
+      # Conversation state ring (turns kept per conversation, truncated response length)
+      CONVERSATION_MAX_TURNS      = "3"
+      CONVERSATION_RESPONSE_CHARS = "200"
+      CONVERSATION_TTL_SECONDS    = "86400"
+
+      # Warm-container profile cache
+      PROFILE_CACHE_MAX_ENTRIES = "1000"
+      PROFILE_CACHE_TTL_SECONDS = "300"
+
+      # Guardrail-scoped response cache (memory, dynamodb, tiered or none)
+      RESPONSE_CACHE_BACKEND     = "tiered"
+      RESPONSE_CACHE_TABLE       = aws_dynamodb_table.response_cache.name
+      RESPONSE_CACHE_TTL_SECONDS = "3600"
+
+      # Per-user and per-segment token buckets (limits are set per segment in policy.json)
+      RATE_LIMIT_ENABLED = "true"
+      RATE_LIMIT_TABLE   = aws_dynamodb_table.rate_limits.name
+
+      # Audit and conversation persistence: SQS consumer (queue) or written before responding (sync)
+      AUDIT_DELIVERY  = var.audit_delivery
+      AUDIT_QUEUE_URL = aws_sqs_queue.audit.url
+
+      # Idempotency-Key records (lease matches the function timeout; duplicates wait up to 25s)
+      IDEMPOTENCY_TABLE         = aws_dynamodb_table.idempotency.name
+      IDEMPOTENCY_TTL_SECONDS   = "86400"
+      IDEMPOTENCY_LEASE_SECONDS = tostring(var.lambda_config.timeout)
+      IDEMPOTENCY_WAIT_SECONDS  = "25"
+
+      # Batch requests ({"queries": [...]})
+      BATCH_MAX_QUERIES     = "20"
+      BATCH_MAX_CONCURRENCY = "4"
+
+      # Bedrock client timeouts and circuit breaker
+      BEDROCK_CONNECT_TIMEOUT           = "2"
+      BEDROCK_READ_TIMEOUT              = "30"
+      BEDROCK_MAX_ATTEMPTS              = "3"
+      BEDROCK_BREAKER_FAILURE_THRESHOLD = "5"
+      BEDROCK_BREAKER_RESET_SECONDS     = "30"
+
+      # Hedged Bedrock calls through cross-region inference profiles (HEDGE_REGION, with
+      # HEDGE_<guardrail env> ids for that region's guardrails, is not provisioned here)
+      HEDGE_ENABLED        = tostring(var.bedrock_hedging.enabled)
+      HEDGE_PROFILE_PREFIX = var.bedrock_hedging.profile_prefix
+      HEDGE_PERCENTILE     = tostring(var.bedrock_hedging.percentile)
+      HEDGE_BUDGET_PERCENT = tostring(var.bedrock_hedging.budget_percent)
+
+      # Per-stage latency metrics (CloudWatch Embedded Metric Format)
+      METRICS_ENABLED   = "true"
+      METRICS_NAMESPACE = local.metrics_namespace
     }
   }
   
@@ -142,4 +236,52 @@ resource "aws_lambda_function" "main" {
     # aws_iam_role_policy_attachment.lambda_vpc,  # Temporarily disabled
     aws_cloudwatch_log_group.lambda
   ]
-}
\ No newline at end of file
+}
+
+# Audit consumer: same package and role, drains the audit queue with BatchWriteItem
+resource "aws_lambda_function" "audit_consumer" {
+  filename         = data.archive_file.lambda_zip.output_path
+  function_name    = "${local.name_prefix}-audit-consumer-${local.suffix}"
+  handler          = "app.audit_consumer_handler"
+  runtime          = var.lambda_config.runtime
+  role             = aws_iam_role.lambda_role.arn
+  source_code_hash = data.archive_file.lambda_zip.output_base64sha256
+  timeout          = var.audit_consumer_timeout
+  memory_size      = 256
+  architectures    = [var.lambda_config.architecture]
+
+  environment {
+    variables = {
+      AUDIT_TABLE                 = aws_dynamodb_table.audit.name
+      CONVERSATION_TABLE          = aws_dynamodb_table.conversations.name
+      CONVERSATION_MAX_TURNS      = "3"
+      CONVERSATION_RESPONSE_CHARS = "200"
+      CONVERSATION_TTL_SECONDS    = "86400"
+
+      # The consumer writes directly; it never calls Bedrock or serves requests
+      AUDIT_DELIVERY         = "sync"
+      RESPONSE_CACHE_BACKEND = "none"
+      METRICS_ENABLED        = "false"
+    }
+  }
+
+  kms_key_arn = aws_kms_key.main.arn
+
+  tags = merge(local.common_tags, {
+    Name    = "${local.name_prefix}-audit-consumer"
+    Purpose = "Batched audit and conversation writes"
+  })
+
+  depends_on = [
+    aws_iam_role_policy.lambda_exec,
+    aws_cloudwatch_log_group.audit_consumer
+  ]
+}
+
+# Partial batch responses: only failed records (and later ones in their group) are redelivered
+resource "aws_lambda_event_source_mapping" "audit_queue" {
+  event_source_arn        = aws_sqs_queue.audit.arn
+  function_name           = aws_lambda_function.audit_consumer.arn
+  batch_size              = 10
+  function_response_types = ["ReportBatchItemFailures"]
+}
@@ -24,6 +24,7 @@ terraform {
 # - api_gateway.tf: API Gateway with JWT authorization
 # - cognito.tf: User authentication and management
 # - dynamodb.tf: User profiles and audit logging
+# - sqs.tf: Audit event queue (drained by the audit consumer in lambda.tf)
 # - vpc.tf: Network isolation and security
 # - waf.tf: Web Application Firewall protection
 # - cloudwatch.tf: Monitoring and logging
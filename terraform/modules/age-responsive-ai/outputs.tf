@@ -24,8 +24,12 @@ output "lambda_function_arn" {
 output "dynamodb_tables" {
   description = "DynamoDB table names"
   value = {
-    users = aws_dynamodb_table.users.name
-    audit = aws_dynamodb_table.audit.name
+    users          = aws_dynamodb_table.users.name
+    audit          = aws_dynamodb_table.audit.name
+    response_cache = aws_dynamodb_table.response_cache.name
+    conversations  = aws_dynamodb_table.conversations.name
+    rate_limits    = aws_dynamodb_table.rate_limits.name
+    idempotency    = aws_dynamodb_table.idempotency.name
   }
 }
 
@@ -49,6 +53,15 @@ output "dynamodb_audit_table_name" {
   value       = aws_dynamodb_table.audit.name
 }
 
+output "audit_queue" {
+  description = "Audit and conversation turn queue and its consumer"
+  value = {
+    url               = aws_sqs_queue.audit.url
+    dead_letter_url   = aws_sqs_queue.audit_dlq.url
+    consumer_function = aws_lambda_function.audit_consumer.function_name
+  }
+}
+
 output "sample_users" {
   description = "Sample users for testing"
   value = {
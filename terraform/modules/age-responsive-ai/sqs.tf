@@ -0,0 +1,35 @@
+# SQS Queues - Age-Responsive AI Module
+# Audit pipeline: one merged event per answered turn (audit item + conversation turn)
+
+# FIFO keeps the turns of one conversation (message group) in order for the consumer
+resource "aws_sqs_queue" "audit" {
+  name                        = "${local.name_prefix}-audit-${local.suffix}.fifo"
+  fifo_queue                  = true
+  content_based_deduplication = false
+  visibility_timeout_seconds  = 6 * var.audit_consumer_timeout
+  message_retention_seconds   = 345600
+  kms_master_key_id           = aws_kms_key.main.arn
+
+  redrive_policy = jsonencode({
+    deadLetterTargetArn = aws_sqs_queue.audit_dlq.arn
+    maxReceiveCount     = 5
+  })
+
+  tags = merge(local.common_tags, {
+    Name    = "${local.name_prefix}-audit-queue"
+    Purpose = "Asynchronous audit and conversation persistence"
+  })
+}
+
+# Events that failed every delivery attempt, kept for replay
+resource "aws_sqs_queue" "audit_dlq" {
+  name                      = "${local.name_prefix}-audit-dlq-${local.suffix}.fifo"
+  fifo_queue                = true
+  message_retention_seconds = 1209600
+  kms_master_key_id         = aws_kms_key.main.arn
+
+  tags = merge(local.common_tags, {
+    Name    = "${local.name_prefix}-audit-dlq"
+    Purpose = "Audit events that could not be written"
+  })
+}
@@ -20,7 +20,7 @@ variable "region" {
 }
 
 variable "bedrock_model_id" {
-  description = "Bedrock model identifier"
+  description = "Bedrock model always granted to the Lambda; per-segment and fallback models are read from lambda/policy.json"
   type        = string
   default     = "anthropic.claude-3-sonnet-20240229-v1:0"
 }
@@ -41,6 +41,39 @@ variable "lambda_config" {
   }
 }
 
+variable "bedrock_hedging" {
+  description = "Hedged Bedrock calls: after the percentile-based delay a second leg goes to the cross-region inference profile profile_prefix + model id, for at most budget_percent of requests"
+  type = object({
+    enabled        = bool
+    profile_prefix = string
+    percentile     = number
+    budget_percent = number
+  })
+  default = {
+    enabled        = false
+    profile_prefix = "us."
+    percentile     = 95
+    budget_percent = 5
+  }
+}
+
+variable "audit_delivery" {
+  description = "How turns are persisted: \"queue\" (SQS consumer, off the request path) or \"sync\" (written before responding)"
+  type        = string
+  default     = "queue"
+
+  validation {
+    condition     = contains(["queue", "sync"], var.audit_delivery)
+    error_message = "audit_delivery must be \"queue\" or \"sync\"."
+  }
+}
+
+variable "audit_consumer_timeout" {
+  description = "Audit consumer Lambda timeout in seconds"
+  type        = number
+  default     = 30
+}
+
 variable "api_gateway_config" {
   description = "API Gateway configuration"
   type = object({
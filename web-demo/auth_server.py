@@ -1,51 +1,348 @@
 #!/usr/bin/env python3
+import base64
+import gzip
+import hashlib
+import hmac
 import json
+import os
 import subprocess
 import sys
 from http.server import HTTPServer, BaseHTTPRequestHandler
 import urllib.parse
 import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timezone
+
+import boto3
+from botocore.config import Config
+from botocore.exceptions import BotoCoreError, ClientError
+
+TERRAFORM_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'terraform', 'examples', 'production')
+
+# Cognito pool/client IDs, resolved once at start (POST /reload-config refreshes them)
+cognito_config = {'pool_id': None, 'client_id': None}
+config_lock = threading.Lock()
+
+# One pooled cognito-idp client shared by every request thread (boto3 clients are thread-safe)
+cognito_client = None
+client_lock = threading.Lock()
+
+def read_terraform_outputs():
+    """All terraform outputs from a single `terraform output -json` call"""
+    output = subprocess.check_output(['terraform', 'output', '-json'], cwd=TERRAFORM_DIR, stderr=subprocess.DEVNULL)
+    return {name: value.get('value') for name, value in json.loads(output).items()}
+
+def load_cognito_config(prefer_environment=True):
+    """
+    Resolve the user pool and app client IDs. start_demo.sh exports them as
+    COGNITO_POOL_ID / COGNITO_CLIENT_ID; terraform is only asked when they are
+    missing, or on reload (prefer_environment=False).
+    """
+    pool_id = os.environ.get('COGNITO_POOL_ID')
+    client_id = os.environ.get('COGNITO_CLIENT_ID')
+    
+    if not (prefer_environment and pool_id and client_id):
+        try:
+            outputs = read_terraform_outputs()
+            pool_id = outputs.get('cognito_user_pool_id') or pool_id
+            client_id = outputs.get('cognito_client_id') or client_id
+        except (subprocess.CalledProcessError, OSError, ValueError) as e:
+            print(f'⚠️ Could not read terraform outputs, keeping environment values: {e}')
+    
+    with config_lock:
+        cognito_config.update(pool_id=pool_id, client_id=client_id)
+        print(f"📋 Using Pool ID: {pool_id}")
+        print(f"📋 Using Client ID: {client_id}")
+        return dict(cognito_config)
+
+def get_cognito_config():
+    with config_lock:
+        return dict(cognito_config)
+
+def get_cognito_client():
+    """Shared cognito-idp client with a connection pool sized for the request threads"""
+    global cognito_client
+    if cognito_client is None:
+        with client_lock:
+            if cognito_client is None:
+                cognito_client = boto3.client('cognito-idp', config=Config(
+                    max_pool_connections=int(os.environ.get('AUTH_SERVER_THREADS', '16')),
+                    connect_timeout=2,
+                    read_timeout=5,
+                    retries={'mode': 'standard', 'max_attempts': 3}
+                ))
+    return cognito_client
+
+class TokenCache:
+    """
+    Cognito tokens per username. The ID token is served until
+    AUTH_TOKEN_REFRESH_MARGIN seconds before it expires, then renewed with the
+    stored refresh token (REFRESH_TOKEN_AUTH) instead of a full password login.
+    Entries only answer for the password they were created with (kept as an
+    HMAC under a per-process key), and are evicted when the password changes
+    or the user is recreated.
+    """
+    
+    def __init__(self, refresh_margin_seconds):
+        self.refresh_margin = refresh_margin_seconds
+        self.entries = {}
+        self.lock = threading.Lock()
+        self.key = os.urandom(32)
+        self.counts = {'hits': 0, 'refreshes': 0, 'logins': 0, 'evictions': 0}
+    
+    def digest(self, password):
+        return hmac.new(self.key, (password or '').encode(), hashlib.sha256).digest()
+    
+    def lookup(self, username, password):
+        """The cached entry for username if the password matches, else None"""
+        with self.lock:
+            entry = self.entries.get(username)
+        if entry and hmac.compare_digest(entry['password_digest'], self.digest(password)):
+            return entry
+        return None
+    
+    def is_fresh(self, entry):
+        return time.time() < entry['expires_at'] - self.refresh_margin
+    
+    def store(self, username, password, auth_result, previous=None):
+        """Cache an AuthenticationResult; refresh responses carry no new refresh token"""
+        entry = {
+            'password_digest': self.digest(password),
+            'id_token': auth_result['IdToken'],
+            'refresh_token': auth_result.get('RefreshToken') or (previous or {}).get('refresh_token'),
+            'expires_at': time.time() + auth_result.get('ExpiresIn', 3600)
+        }
+        with self.lock:
+            self.entries[username] = entry
+        return entry
+    
+    def evict(self, username):
+        with self.lock:
+            if self.entries.pop(username, None):
+                self.counts['evictions'] += 1
+    
+    def record(self, outcome):
+        with self.lock:
+            self.counts[outcome] += 1
+    
+    def stats(self):
+        with self.lock:
+            return dict(self.counts, size=len(self.entries))
+
+token_cache = TokenCache(int(os.environ.get('AUTH_TOKEN_REFRESH_MARGIN', '300')))
+
+# Age group boundaries: under 13 child (COPPA), under 18 teen, under 65 adult, then senior.
+# Keep in sync with lambda/app.py, which recomputes the group only once it has expired.
+AGE_GROUP_BOUNDARIES = ((13, 'child'), (18, 'teen'), (65, 'adult'))
+
+def birthday_in_year(birth_date, year):
+    """Anniversary of birth_date in `year`; 29 February falls on 1 March in common years"""
+    try:
+        return birth_date.replace(year=year)
+    except ValueError:
+        return date(year, 3, 1)
+
+def age_group_fields(birth_date_str):
+    """
+    Materialized age_group for a profile plus age_group_expires, the exact
+    date (YYYY-MM-DD) the group next changes. Seniors have no expiry.
+    Raises ValueError for a birth date that is not YYYY-MM-DD.
+    """
+    birth_date = datetime.strptime(birth_date_str, '%Y-%m-%d').date()
+    today = datetime.now(timezone.utc).date()
+    for years, group in AGE_GROUP_BOUNDARIES:
+        boundary = birthday_in_year(birth_date, birth_date.year + years)
+        if today < boundary:
+            return {'age_group': group, 'age_group_expires': boundary.isoformat()}
+    return {'age_group': 'senior'}
+
+USERS_TABLE = os.environ.get('DYNAMODB_USERS_TABLE', 'ResponsiveAI-Users')
+
+# /list-users pages: only the fields the user cards display
+LIST_USERS_PAGE_SIZE = 100
+LIST_USERS_MAX_PAGE_SIZE = 500
+LIST_USERS_PROJECTION = ('user_id', 'name', 'birth_date', 'role', 'industry', 'age_group')
+LIST_USERS_CACHE_TTL = float(os.environ.get('LIST_USERS_CACHE_TTL', '5'))
+
+# Short-TTL cache of encoded /list-users pages keyed by (cursor, limit); cleared on writes
+list_users_cache = {}
+list_users_cache_lock = threading.Lock()
+
+# boto3 resources are not thread-safe, so each request thread keeps its own
+thread_local = threading.local()
+
+def get_users_table():
+    if not hasattr(thread_local, 'users_table'):
+        # Built on the default session, which is not thread-safe either: same lock as the shared client
+        with client_lock:
+            thread_local.users_table = boto3.resource('dynamodb').Table(USERS_TABLE)
+    return thread_local.users_table
+
+def encode_cursor(last_evaluated_key):
+    """Opaque cursor token for a scan's LastEvaluatedKey"""
+    if not last_evaluated_key:
+        return None
+    return base64.urlsafe_b64encode(json.dumps(last_evaluated_key).encode()).decode()
+
+def decode_cursor(cursor):
+    """Raises ValueError for a token that was not produced by encode_cursor"""
+    key = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    if not isinstance(key, dict) or set(key) != {'user_id'} or not isinstance(key['user_id'], str):
+        raise ValueError('invalid cursor')
+    return key
+
+def list_users_page(table, cursor=None, limit=LIST_USERS_PAGE_SIZE):
+    """One page of users (projected) plus the cursor for the next page, served from the short-TTL cache"""
+    cache_key = (cursor, limit)
+    now = time.monotonic()
+    with list_users_cache_lock:
+        cached = list_users_cache.get(cache_key)
+        if cached and cached[0] > now:
+            return cached[1]
+    
+    names = {f'#f{i}': field for i, field in enumerate(LIST_USERS_PROJECTION)}
+    scan_args = {
+        'Limit': limit,
+        'ProjectionExpression': ', '.join(names),
+        'ExpressionAttributeNames': names,
+        # Consistent so a listing right after a reset or create never shows stale rows
+        'ConsistentRead': True
+    }
+    if cursor:
+        scan_args['ExclusiveStartKey'] = decode_cursor(cursor)
+    response = table.scan(**scan_args)
+    
+    body = json.dumps({
+        'users': response.get('Items', []),
+        'next_cursor': encode_cursor(response.get('LastEvaluatedKey'))
+    }, default=str).encode()
+    with list_users_cache_lock:
+        list_users_cache[cache_key] = (now + LIST_USERS_CACHE_TTL, body)
+    return body
+
+def invalidate_list_users_cache():
+    with list_users_cache_lock:
+        list_users_cache.clear()
+
+# Personas seeded by create_default_users (also replayed by lambda/benchmarks/load_test.py)
+DEMO_USERS = [
+    {'user_id': 'student-123', 'name': 'Alex (Student)', 'birth_date': '2010-05-15', 'role': 'student', 'industry': 'education', 'device': 'desktop'},
+    {'user_id': 'teacher-456', 'name': 'Sarah (Teacher)', 'birth_date': '1984-08-22', 'role': 'teacher', 'industry': 'education', 'device': 'desktop'},
+    {'user_id': 'patient-789', 'name': 'John (Patient)', 'birth_date': '1974-12-10', 'role': 'patient', 'industry': 'healthcare', 'device': 'desktop'},
+    {'user_id': 'provider-101', 'name': 'Dr. Smith (Doctor)', 'birth_date': '1979-03-18', 'role': 'provider', 'industry': 'healthcare', 'device': 'desktop'}
+]
+
+STATIC_DIR = os.path.dirname(os.path.abspath(__file__))
+STATIC_ASSETS = {
+    'index.html': 'text/html; charset=utf-8',
+    'config.js': 'application/javascript; charset=utf-8',
+    'script.js': 'application/javascript; charset=utf-8',
+    'style.css': 'text/css; charset=utf-8'
+}
+
+# Preloaded static assets: path -> body, gzip body, ETag and content type
+static_cache = {}
+
+def load_static_assets():
+    """Read the demo assets once, precomputing gzip bodies and ETags (config.js is generated before start)"""
+    global static_cache
+    assets = {}
+    for name, content_type in STATIC_ASSETS.items():
+        try:
+            with open(os.path.join(STATIC_DIR, name), 'rb') as f:
+                body = f.read()
+        except FileNotFoundError:
+            print(f'⚠️ Static asset {name} not found')
+            continue
+        assets['/' + name] = {
+            'body': body,
+            'gzip': gzip.compress(body, compresslevel=9, mtime=0),
+            'etag': '"' + hashlib.sha256(body).hexdigest()[:16] + '"',
+            'content_type': content_type
+        }
+    if '/index.html' in assets:
+        assets['/'] = assets['/index.html']
+    # Swap in one assignment so request threads never see a half-loaded cache
+    static_cache = assets
+    print(f'📦 Loaded {len(set(map(id, assets.values())))} static assets')
+
+class PooledHTTPServer(HTTPServer):
+    """HTTPServer that handles each connection on a bounded worker pool"""
+    
+    def __init__(self, server_address, handler_class, max_workers):
+        super().__init__(server_address, handler_class)
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='auth-server')
+    
+    def process_request(self, request, client_address):
+        self.pool.submit(self.process_request_thread, request, client_address)
+    
+    def process_request_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+    
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown(wait=False)
 
 class AuthHandler(BaseHTTPRequestHandler):
     users_initialized = False  # Class variable to track initialization
+    users_init_lock = threading.Lock()  # Request threads race for the first /list-users
     
     def do_POST(self):
-        if self.path == '/auth':
+        route = urllib.parse.urlsplit(self.path).path
+        if route == '/auth':
             self.handle_auth()
-        elif self.path == '/create-user':
+        elif route == '/create-user':
             self.handle_create_user()
+        elif route == '/reload-config':
+            self.handle_reload_config()
         else:
             self.serve_static_file()
     
     def do_GET(self):
-        if self.path == '/list-users':
+        if urllib.parse.urlsplit(self.path).path == '/list-users':
             self.handle_list_users()
         else:
             self.serve_static_file()
     
     def handle_list_users(self):
+        """GET /list-users?limit=N&cursor=T -> {"users": [...], "next_cursor": T or null}"""
         try:
-            import boto3
-            
-            dynamodb = boto3.resource('dynamodb')
-            table = dynamodb.Table('ResponsiveAI-Users')
+            table = get_users_table()
             
             # Only initialize users once per server session
-            if not AuthHandler.users_initialized:
-                print('🔄 Initializing demo users...')
-                self.clear_and_create_demo_users(table)
-                AuthHandler.users_initialized = True
+            with AuthHandler.users_init_lock:
+                if not AuthHandler.users_initialized:
+                    print('🔄 Initializing demo users...')
+                    self.clear_and_create_demo_users(table)
+                    AuthHandler.users_initialized = True
             
-            response = table.scan()
-            users = response.get('Items', [])
+            params = urllib.parse.parse_qs(urllib.parse.urlsplit(self.path).query)
+            try:
+                limit = int(params.get('limit', [LIST_USERS_PAGE_SIZE])[0])
+                if not 1 <= limit <= LIST_USERS_MAX_PAGE_SIZE:
+                    raise ValueError('limit out of range')
+                body = list_users_page(table, params.get('cursor', [None])[0], limit)
+            except (ValueError, TypeError):
+                self.send_response(400)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Access-Control-Allow-Origin', '*')
+                self.end_headers()
+                
+                self.wfile.write(json.dumps({'error': f'limit must be 1-{LIST_USERS_MAX_PAGE_SIZE} and cursor a next_cursor value'}).encode())
+                return
             
             self.send_response(200)
             self.send_header('Content-Type', 'application/json')
             self.send_header('Access-Control-Allow-Origin', '*')
             self.end_headers()
             
-            self.wfile.write(json.dumps(users).encode())
+            self.wfile.write(body)
             
         except Exception as e:
             print(f'❌ Error listing users: {e}')
@@ -54,45 +351,47 @@ class AuthHandler(BaseHTTPRequestHandler):
             self.send_header('Access-Control-Allow-Origin', '*')
             self.end_headers()
             
-            self.wfile.write(json.dumps([]).encode())
+            self.wfile.write(json.dumps({'users': [], 'next_cursor': None}).encode())
     
     def clear_and_create_demo_users(self, table):
         """Clear all users and create fresh demo users"""
         try:
-            # Clear existing users more thoroughly
+            # Walk every scan page (keys only); batch_writer resends unprocessed items itself
             print('🧹 Clearing all existing users...')
-            response = table.scan()
+            deleted = 0
+            scan_args = {'ProjectionExpression': 'user_id', 'ConsistentRead': True}
             with table.batch_writer() as batch:
-                for item in response.get('Items', []):
-                    batch.delete_item(Key={'user_id': item['user_id']})
-            
-            # Wait a moment for cleanup to complete
-            import time
-            time.sleep(1)
+                while True:
+                    response = table.scan(**scan_args)
+                    for item in response.get('Items', []):
+                        batch.delete_item(Key={'user_id': item['user_id']})
+                        deleted += 1
+                    if 'LastEvaluatedKey' not in response:
+                        break
+                    scan_args['ExclusiveStartKey'] = response['LastEvaluatedKey']
+            print(f'🧹 Deleted {deleted} users')
             
             # Create fresh demo users
             print('🎆 Creating fresh demo users...')
             self.create_default_users(table)
         except Exception as e:
             print(f'❌ Error refreshing users: {e}')
+        finally:
+            invalidate_list_users_cache()
     
     def create_default_users(self, table):
         """Create default demo users with nice names"""
-        from datetime import datetime
-        
-        demo_users = [
-            {'user_id': 'student-123', 'name': 'Alex (Student)', 'birth_date': '2010-05-15', 'role': 'student', 'industry': 'education', 'device': 'desktop', 'created_at': datetime.now().isoformat()},
-            {'user_id': 'teacher-456', 'name': 'Sarah (Teacher)', 'birth_date': '1984-08-22', 'role': 'teacher', 'industry': 'education', 'device': 'desktop', 'created_at': datetime.now().isoformat()},
-            {'user_id': 'patient-789', 'name': 'John (Patient)', 'birth_date': '1974-12-10', 'role': 'patient', 'industry': 'healthcare', 'device': 'desktop', 'created_at': datetime.now().isoformat()},
-            {'user_id': 'provider-101', 'name': 'Dr. Smith (Doctor)', 'birth_date': '1979-03-18', 'role': 'provider', 'industry': 'healthcare', 'device': 'desktop', 'created_at': datetime.now().isoformat()}
-        ]
+        demo_users = [dict(user, created_at=datetime.now().isoformat()) for user in DEMO_USERS]
         
-        for user in demo_users:
-            try:
-                table.put_item(Item=user)
+        try:
+            with table.batch_writer() as batch:
+                for user in demo_users:
+                    user.update(age_group_fields(user['birth_date']))
+                    batch.put_item(Item=user)
+            for user in demo_users:
                 print(f'✅ Demo user created: {user["name"]} ({user["user_id"]})')
-            except Exception as e:
-                print(f'❌ Error creating demo user {user["user_id"]}: {e}')
+        except Exception as e:
+            print(f'❌ Error creating demo users: {e}')
     
     def handle_create_user(self):
         try:
@@ -108,14 +407,21 @@ class AuthHandler(BaseHTTPRequestHandler):
             industry = data.get('industry')
             device = data.get('device', 'desktop')
             
+            try:
+                age_fields = age_group_fields(birthdate)
+            except (TypeError, ValueError):
+                self.send_response(400)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Access-Control-Allow-Origin', '*')
+                self.end_headers()
+                
+                self.wfile.write(json.dumps({'error': 'birthdate must be YYYY-MM-DD'}).encode())
+                return
+            
             print(f"👤 Creating user: {username} ({name})")
             
             # Create user in DynamoDB
-            import boto3
-            from datetime import datetime
-            
-            dynamodb = boto3.resource('dynamodb')
-            table = dynamodb.Table('ResponsiveAI-Users')
+            table = get_users_table()
             
             user_item = {
                 'user_id': username,
@@ -124,40 +430,41 @@ class AuthHandler(BaseHTTPRequestHandler):
                 'role': role,
                 'industry': industry,
                 'device': device,
-                'created_at': datetime.now().isoformat()
+                'created_at': datetime.now().isoformat(),
+                **age_fields
             }
             
             table.put_item(Item=user_item)
+            invalidate_list_users_cache()
             print(f"✅ User {username} created in DynamoDB")
             
             # Create user in Cognito
+            temp_password = f"{username.capitalize()}123!"  # Consistent password pattern like the demo users
+            pool_id = get_cognito_config()['pool_id']
+            # Recreated user / new password: tokens issued for the old identity must not be reused
+            token_cache.evict(username)
             try:
-                pool_id = subprocess.check_output(['terraform', 'output', '-raw', 'cognito_user_pool_id'], 
-                                                cwd='../terraform/examples/production').decode().strip()
-                
-                # Use consistent password pattern like the demo users
-                temp_password = f"{username.capitalize()}123!"
-                create_cmd = [
-                    'aws', 'cognito-idp', 'admin-create-user',
-                    '--user-pool-id', pool_id,
-                    '--username', username,
-                    '--temporary-password', temp_password,
-                    '--message-action', 'SUPPRESS'
-                ]
-                subprocess.check_output(create_cmd, stderr=subprocess.DEVNULL)
+                client = get_cognito_client()
+                try:
+                    client.admin_create_user(
+                        UserPoolId=pool_id,
+                        Username=username,
+                        TemporaryPassword=temp_password,
+                        MessageAction='SUPPRESS'
+                    )
+                except client.exceptions.UsernameExistsException:
+                    print(f"👤 User {username} already exists in Cognito, resetting password")
                 
                 # Set permanent password
-                set_password_cmd = [
-                    'aws', 'cognito-idp', 'admin-set-user-password',
-                    '--user-pool-id', pool_id,
-                    '--username', username,
-                    '--password', temp_password,
-                    '--permanent'
-                ]
-                subprocess.check_output(set_password_cmd, stderr=subprocess.DEVNULL)
+                client.admin_set_user_password(
+                    UserPoolId=pool_id,
+                    Username=username,
+                    Password=temp_password,
+                    Permanent=True
+                )
                 print(f"✅ User {username} created in Cognito with password: {temp_password}")
                 
-            except subprocess.CalledProcessError as e:
+            except (ClientError, BotoCoreError) as e:
                 print(f"⚠️ Cognito user creation failed, but DynamoDB user exists: {e}")
             
             # Return success with password info
@@ -169,7 +476,7 @@ class AuthHandler(BaseHTTPRequestHandler):
             response = {
                 'success': True, 
                 'message': f'User {username} created successfully',
-                'password': f'{username.capitalize()}123!' if 'temp_password' in locals() else 'Check console'
+                'password': temp_password
             }
             self.wfile.write(json.dumps(response).encode())
             
@@ -195,34 +502,14 @@ class AuthHandler(BaseHTTPRequestHandler):
             
             print(f"🔐 Authenticating user: {username}")
             
-            # Get Cognito details from terraform
+            config = get_cognito_config()
+            pool_id = config['pool_id']
+            client_id = config['client_id']
+            started = time.perf_counter()
+            
             try:
-                pool_id = subprocess.check_output(['terraform', 'output', '-raw', 'cognito_user_pool_id'], 
-                                                cwd='../terraform/examples/production').decode().strip()
-                client_id = subprocess.check_output(['terraform', 'output', '-raw', 'cognito_client_id'], 
-                                                  cwd='../terraform/examples/production').decode().strip()
-                
-                print(f"📋 Using Pool ID: {pool_id}")
-                print(f"📋 Using Client ID: {client_id}")
-                
-                # First, try to create the user if it doesn't exist
-                self.ensure_user_exists(pool_id, username, password)
-                
-                # Authenticate with Cognito using AWS CLI
-                print(f"🔑 Attempting authentication for {username}...")
-                cmd = [
-                    'aws', 'cognito-idp', 'admin-initiate-auth',
-                    '--user-pool-id', pool_id,
-                    '--client-id', client_id,
-                    '--auth-flow', 'ADMIN_NO_SRP_AUTH',
-                    '--auth-parameters', f'USERNAME={username},PASSWORD={password}'
-                ]
-                
-                result = subprocess.check_output(cmd, stderr=subprocess.DEVNULL)
-                auth_result = json.loads(result.decode())
-                
-                id_token = auth_result['AuthenticationResult']['IdToken']
-                print(f"✅ Authentication successful for {username}")
+                id_token, source = self.get_id_token(pool_id, client_id, username, password)
+                print(f"✅ Authentication successful for {username} via {source} ({(time.perf_counter() - started) * 1000:.0f} ms)")
                 
                 # Return token
                 self.send_response(200)
@@ -230,10 +517,10 @@ class AuthHandler(BaseHTTPRequestHandler):
                 self.send_header('Access-Control-Allow-Origin', '*')
                 self.end_headers()
                 
-                response = {'idToken': id_token}
+                response = {'idToken': id_token, 'source': source}
                 self.wfile.write(json.dumps(response).encode())
                 
-            except subprocess.CalledProcessError as e:
+            except (ClientError, BotoCoreError) as e:
                 print(f"❌ Authentication failed for {username}: {e}")
                 # Authentication failed - return fallback token
                 print(f"🔄 Using fallback token for {username}")
@@ -257,42 +544,89 @@ class AuthHandler(BaseHTTPRequestHandler):
             response = {'error': str(e)}
             self.wfile.write(json.dumps(response).encode())
     
+    def get_id_token(self, pool_id, client_id, username, password):
+        """ID token from the cache, a refresh-token renewal, or a full login (in that order)"""
+        client = get_cognito_client()
+        entry = token_cache.lookup(username, password)
+        
+        if entry and token_cache.is_fresh(entry):
+            token_cache.record('hits')
+            return entry['id_token'], 'cache'
+        
+        if entry and entry['refresh_token']:
+            try:
+                auth_result = client.admin_initiate_auth(
+                    UserPoolId=pool_id,
+                    ClientId=client_id,
+                    AuthFlow='REFRESH_TOKEN_AUTH',
+                    AuthParameters={'REFRESH_TOKEN': entry['refresh_token']}
+                )
+                token_cache.record('refreshes')
+                return token_cache.store(username, password, auth_result['AuthenticationResult'], entry)['id_token'], 'refresh'
+            except ClientError as e:
+                # Expired or revoked refresh token: fall back to a password login
+                print(f"🔄 Refresh failed for {username}, logging in again: {e}")
+                token_cache.evict(username)
+        
+        # First, try to create the user if it doesn't exist
+        self.ensure_user_exists(pool_id, username, password)
+        
+        # Authenticate with Cognito through the shared client
+        print(f"🔑 Attempting authentication for {username}...")
+        auth_result = client.admin_initiate_auth(
+            UserPoolId=pool_id,
+            ClientId=client_id,
+            AuthFlow='ADMIN_NO_SRP_AUTH',
+            AuthParameters={'USERNAME': username, 'PASSWORD': password}
+        )
+        token_cache.record('logins')
+        return token_cache.store(username, password, auth_result['AuthenticationResult'])['id_token'], 'login'
+    
     def ensure_user_exists(self, pool_id, username, password):
         """Ensure user exists in Cognito, create if not"""
+        client = get_cognito_client()
         try:
             # Check if user exists
-            check_cmd = ['aws', 'cognito-idp', 'admin-get-user', '--user-pool-id', pool_id, '--username', username]
-            subprocess.check_output(check_cmd, stderr=subprocess.DEVNULL)
+            client.admin_get_user(UserPoolId=pool_id, Username=username)
             print(f"👤 User {username} already exists")
-        except subprocess.CalledProcessError:
+        except client.exceptions.UserNotFoundException:
             # User doesn't exist, create it
             print(f"👤 Creating user {username}...")
             try:
-                create_cmd = [
-                    'aws', 'cognito-idp', 'admin-create-user',
-                    '--user-pool-id', pool_id,
-                    '--username', username,
-                    '--temporary-password', password,
-                    '--message-action', 'SUPPRESS'
-                ]
-                subprocess.check_output(create_cmd, stderr=subprocess.DEVNULL)
+                client.admin_create_user(
+                    UserPoolId=pool_id,
+                    Username=username,
+                    TemporaryPassword=password,
+                    MessageAction='SUPPRESS'
+                )
+                token_cache.evict(username)
                 print(f"✅ User {username} created successfully")
                 
                 # Set permanent password
                 print(f"🔑 Setting permanent password for {username}...")
-                set_password_cmd = [
-                    'aws', 'cognito-idp', 'admin-set-user-password',
-                    '--user-pool-id', pool_id,
-                    '--username', username,
-                    '--password', password,
-                    '--permanent'
-                ]
-                subprocess.check_output(set_password_cmd, stderr=subprocess.DEVNULL)
+                client.admin_set_user_password(
+                    UserPoolId=pool_id,
+                    Username=username,
+                    Password=password,
+                    Permanent=True
+                )
                 print(f"✅ Password set for {username}")
                 
-            except subprocess.CalledProcessError as e:
+            except ClientError as e:
                 print(f"❌ Failed to create user {username}: {e}")
     
+    def handle_reload_config(self):
+        """Re-read the Cognito IDs from terraform and the static assets, e.g. after redeploying the stack"""
+        config = load_cognito_config(prefer_environment=False)
+        load_static_assets()
+        
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+        
+        self.wfile.write(json.dumps({'success': True, 'cognito': config}).encode())
+    
     def generate_fallback_token(self, username, client_id):
         """Generate a fallback JWT token for demo purposes"""
         import base64
@@ -325,45 +659,50 @@ class AuthHandler(BaseHTTPRequestHandler):
         self.end_headers()
     
     def serve_static_file(self):
-        # Simple static file serving
-        if self.path == '/' or self.path == '/index.html':
-            file_path = 'index.html'
-        elif self.path.startswith('/'):
-            file_path = self.path[1:]  # Remove leading slash
-        else:
-            file_path = self.path
-            
-        try:
-            with open(file_path, 'rb') as f:
-                content = f.read()
-                
-            # Determine content type
-            if file_path.endswith('.html'):
-                content_type = 'text/html'
-            elif file_path.endswith('.js'):
-                content_type = 'application/javascript'
-            elif file_path.endswith('.css'):
-                content_type = 'text/css'
-            else:
-                content_type = 'text/plain'
-                
-            self.send_response(200)
-            self.send_header('Content-Type', content_type)
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.end_headers()
-            self.wfile.write(content)
-            
-        except FileNotFoundError:
+        """Serve a preloaded asset: 304 on a matching If-None-Match, gzip when accepted"""
+        asset = static_cache.get(urllib.parse.urlsplit(self.path).path)
+        if asset is None:
             self.send_response(404)
             self.end_headers()
             self.wfile.write(b'File not found')
+            return
+        
+        if self.headers.get('If-None-Match') == asset['etag']:
+            self.send_response(304)
+            self.send_header('ETag', asset['etag'])
+            self.send_header('Cache-Control', 'no-cache')
+            self.end_headers()
+            return
+        
+        use_gzip = 'gzip' in self.headers.get('Accept-Encoding', '')
+        body = asset['gzip'] if use_gzip else asset['body']
+        
+        self.send_response(200)
+        self.send_header('Content-Type', asset['content_type'])
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', asset['etag'])
+        # Revalidate on every load; unchanged assets cost a 304 with no body
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Vary', 'Accept-Encoding')
+        if use_gzip:
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+        self.wfile.write(body)
 
 def start_auth_server():
     # Reset initialization flag on server start
     AuthHandler.users_initialized = False
     
-    server = HTTPServer(('localhost', 8080), AuthHandler)
-    print("🔐 Auth server running on http://localhost:8080")
+    # Resolve configuration and build the Cognito client once, not per login
+    load_cognito_config()
+    get_cognito_client()
+    load_static_assets()
+    
+    # Bounded pool: a slow Cognito or DynamoDB call no longer blocks other tabs
+    max_workers = int(os.environ.get('AUTH_SERVER_THREADS', '16'))
+    server = PooledHTTPServer(('localhost', 8080), AuthHandler, max_workers)
+    print(f"🔐 Auth server running on http://localhost:8080 ({max_workers} worker threads)")
     try:
         server.serve_forever()
     except KeyboardInterrupt:
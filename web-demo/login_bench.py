@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Login latency: per-request subprocess calls vs cached config + shared boto3 client.
+
+"subprocess" replays what /auth used to do on every login: two `terraform output`
+calls, `aws cognito-idp admin-get-user` and `aws cognito-idp admin-initiate-auth`.
+"boto3" is the current path: IDs resolved once, then admin_get_user and
+admin_initiate_auth on the pooled client. Both log in the same demo user, so
+the difference is process startup and client construction.
+
+Requires a deployed stack and AWS credentials. Run from the web-demo folder:
+    python3 login_bench.py --username student-123 --password Student123! --iterations 10
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import time
+
+import auth_server
+
+def subprocess_login(username, password):
+    """The previous handle_auth sequence, one CLI process per step"""
+    pool_id = subprocess.check_output(['terraform', 'output', '-raw', 'cognito_user_pool_id'],
+                                      cwd=auth_server.TERRAFORM_DIR).decode().strip()
+    client_id = subprocess.check_output(['terraform', 'output', '-raw', 'cognito_client_id'],
+                                        cwd=auth_server.TERRAFORM_DIR).decode().strip()
+    subprocess.check_output(['aws', 'cognito-idp', 'admin-get-user', '--user-pool-id', pool_id,
+                             '--username', username], stderr=subprocess.DEVNULL)
+    result = subprocess.check_output([
+        'aws', 'cognito-idp', 'admin-initiate-auth',
+        '--user-pool-id', pool_id,
+        '--client-id', client_id,
+        '--auth-flow', 'ADMIN_NO_SRP_AUTH',
+        '--auth-parameters', f'USERNAME={username},PASSWORD={password}'
+    ], stderr=subprocess.DEVNULL)
+    return json.loads(result.decode())['AuthenticationResult']['IdToken']
+
+def boto3_login(username, password):
+    """The current handle_auth sequence against the shared client"""
+    config = auth_server.get_cognito_config()
+    client = auth_server.get_cognito_client()
+    client.admin_get_user(UserPoolId=config['pool_id'], Username=username)
+    result = client.admin_initiate_auth(
+        UserPoolId=config['pool_id'],
+        ClientId=config['client_id'],
+        AuthFlow='ADMIN_NO_SRP_AUTH',
+        AuthParameters={'USERNAME': username, 'PASSWORD': password}
+    )
+    return result['AuthenticationResult']['IdToken']
+
+def measure(login, username, password, iterations):
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        login(username, password)
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return {
+        'median_ms': statistics.median(samples),
+        'p95_ms': samples[min(len(samples) - 1, int(round(0.95 * len(samples))) - 1)],
+        'max_ms': samples[-1]
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--username', default='student-123')
+    parser.add_argument('--password', default='Student123!')
+    parser.add_argument('--iterations', type=int, default=10)
+    args = parser.parse_args()
+
+    # Server start-up work, paid once and not per login
+    auth_server.load_cognito_config()
+    auth_server.get_cognito_client()
+
+    results = {
+        'subprocess': measure(subprocess_login, args.username, args.password, args.iterations),
+        'boto3': measure(boto3_login, args.username, args.password, args.iterations)
+    }
+
+    print(f"{'path':<12} {'median':>9} {'p95':>9} {'max':>9}")
+    for path, stats in results.items():
+        print(f"{path:<12} {stats['median_ms']:>8.0f}ms {stats['p95_ms']:>8.0f}ms {stats['max_ms']:>8.0f}ms")
+    print(f"speedup (median): {results['subprocess']['median_ms'] / results['boto3']['median_ms']:.1f}x")
+
+if __name__ == '__main__':
+    main()
@@ -154,16 +154,23 @@ async function loadExistingUsers() {
     if (usersLoaded) return; // Prevent multiple loads
     
     try {
-        const response = await fetch('/list-users');
-        if (response.ok) {
-            const users = await response.json();
-            console.log('📥 Loaded users:', users.length);
-            users.forEach(user => {
+        // Follow next_cursor until the listing is exhausted
+        let cursor = null;
+        let loaded = 0;
+        do {
+            const url = cursor ? `/list-users?cursor=${encodeURIComponent(cursor)}` : '/list-users';
+            const response = await fetch(url);
+            if (!response.ok) return;
+            const page = await response.json();
+            page.users.forEach(user => {
                 const age = calculateAge(user.birth_date);
                 addUserCard(user.user_id, user.name || user.user_id, user.role, user.industry, age);
             });
-            usersLoaded = true;
-        }
+            loaded += page.users.length;
+            cursor = page.next_cursor;
+        } while (cursor);
+        console.log('📥 Loaded users:', loaded);
+        usersLoaded = true;
     } catch (error) {
         console.log('No existing users found or error loading users:', error);
     }